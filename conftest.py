@@ -0,0 +1,32 @@
+import os
+
+import django
+import pytest
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+def pytest_configure(config):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'xero_assets.settings')
+    django.setup()
+
+
+@pytest.fixture(scope='session')
+def django_db_setup():
+    # Test database created once for the session, migrated like a deployment
+    setup_test_environment()
+    old_name: str = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    yield
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+    teardown_test_environment()
+
+
+@pytest.fixture
+def db(django_db_setup):
+    # Each test runs in a transaction rolled back at the end, the atomic blocks of the code become savepoints
+    atomic = transaction.atomic()
+    atomic.__enter__()
+    yield
+    transaction.set_rollback(True)
+    atomic.__exit__(None, None, None)
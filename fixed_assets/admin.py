@@ -1,6 +1,6 @@
 from django.contrib.admin import ModelAdmin, site
 from .models import (AssetSetting, AssetAccount, AssetType, Asset,
-                     CalculatedDepreciation, DisposedAsset)
+                     CalculatedDepreciation, DisposedAsset, DepreciationRun, DepreciationWorkUnit)
 
 
 class CustomAdminParent:
@@ -58,6 +58,20 @@ class CustomDisposedAssetsAdmin(ModelAdmin, CustomAdminParent):
     list_display = ('pk', 'asset', 'disposal_date', 'disposal_price', 'gain_on_disposal_account',
                     'capital_gain_account', 'loss_on_disposal_account', 'gain_losses')
 
+
+class CustomDepreciationRunAdmin(ModelAdmin, CustomAdminParent):
+    search_fields = ('pk', 'user__email', 'worker')
+    list_display = ('pk', 'user', 'to_date', 'incremental', 'status', 'assets_total', 'assets_processed',
+                    'created_at', 'finished_at')
+    list_filter = ('status',)
+
+
+class CustomDepreciationWorkUnitAdmin(ModelAdmin, CustomAdminParent):
+    search_fields = ('pk', 'run__pk', 'worker')
+    list_display = ('pk', 'run', 'first_asset_pk', 'last_asset_pk', 'status', 'worker', 'attempts',
+                    'lease_expires_at', 'finished_at')
+    list_filter = ('status',)
+
 # class CustomRegionAdmin(ModelAdmin):
 #     search_fields = ('pk', 'region_name')
 #     list_display = ('pk', 'region_name')
@@ -73,4 +87,6 @@ site.register(AssetType, CustomAssetTypeAdmin)
 site.register(Asset, CustomAssetAdmin)
 site.register(CalculatedDepreciation, CustomCalculatedDepreciationAdmin)
 site.register(DisposedAsset, CustomDisposedAssetsAdmin)
+site.register(DepreciationRun, CustomDepreciationRunAdmin)
+site.register(DepreciationWorkUnit, CustomDepreciationWorkUnitAdmin)
 # site.register(Region, CustomRegionAdmin)
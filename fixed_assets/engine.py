@@ -0,0 +1,100 @@
+from datetime import date
+from hashlib import sha1
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from .periods import days_in_year, days_in_period
+from .utils import AssetParams, Kernel, NO_DEPRECIATION, PER_DAY, PRORATED, compile_kernel
+
+DEPRECIATION_INPUTS = ('purchase_price', 'cost_limit', 'residual_value', 'rate', 'effective_life',
+                       'depreciation_method', 'averaging_method')
+
+
+def round_2(values: np.ndarray) -> np.ndarray:
+    # Same result as the builtin round(value, 2) used by the calculators, element by element.
+    # np.round() scales by 100 first, which can flip values sitting on a .xx5 boundary,
+    # so those few cells are re-rounded with the builtin.
+    scaled: np.ndarray = values * 100
+    result: np.ndarray = np.rint(scaled) / 100
+    fraction: np.ndarray = np.abs(scaled - np.trunc(scaled))
+    ties: np.ndarray = np.abs(fraction - 0.5) <= np.abs(np.spacing(scaled)) * 2
+    for index in zip(*np.nonzero(ties)):
+        result[index] = round(float(values[index]), 2)
+    return result
+
+
+def inputs_fingerprint(asset, start_date: Union[date, str]) -> str:
+    # Changes whenever anything the schedule of the asset depends on changes
+    values: List[str] = [str(start_date)]
+    for key in DEPRECIATION_INPUTS:
+        value = getattr(asset, key)
+        values.append(value if isinstance(value, str) else repr(float(value) if value else 0.0))
+    return sha1('|'.join(values).encode()).hexdigest()
+
+
+def cap_depreciation(depreciations: np.ndarray, remaining: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Caps the running total of each row at its remaining depreciable amount (see utils.get_depreciable_amount).
+    # Returns the capped matrix and, for each row, the column fully depreciating the asset (-1 : not reached).
+    if not depreciations.size:
+        return depreciations, np.full(len(depreciations), -1, dtype=np.int64)
+    remaining = np.maximum(remaining, 0.0)[:, None]
+    totals: np.ndarray = np.cumsum(depreciations, axis=1)
+    capped_totals: np.ndarray = np.minimum(totals, remaining)
+    previous_totals: np.ndarray = np.hstack([np.zeros((len(depreciations), 1)), capped_totals[:, :-1]])
+    # Periods before the cap keep their exact value
+    capped: np.ndarray = np.where(totals <= remaining, depreciations, round_2(capped_totals - previous_totals))
+    reached: np.ndarray = totals >= remaining - 0.005
+    return capped, np.where(reached.any(axis=1), reached.argmax(axis=1), -1)
+
+
+def period_day_counts(period_dates: Sequence[date]):
+    # Each period runs from the 1st to the last day of its month, as in AssetRunDepreciationView
+    return (np.array([days_in_year(date_) for date_ in period_dates], dtype=np.int64),
+            np.array([days_in_period(date_) for date_ in period_dates], dtype=np.int64))
+
+
+def compile_kernels(assets: Iterable) -> List[Union[Kernel, None]]:
+    # Kernels do not depend on the start date, only the day counts of each period do
+    return [compile_kernel(AssetParams.from_asset(asset, None)) for asset in assets]
+
+
+class BatchDepreciation:
+    """Depreciation of many assets over many month-end dates in one vectorized pass.
+
+    Row i of the result holds asset i, column j holds period_dates[j]; every cell equals what
+    StraightLine / DecliningBalanceBy100Or150Or200 / FullDepreciation return for that asset
+    with a depreciation_start_date on the 1st of that month.
+    """
+
+    def __init__(self, kernels: Sequence[Union[Kernel, None]], period_dates: Sequence[date]):
+        # Assets without kernel (ND) are not depreciated
+        kernels: List[Kernel] = [kernel or NO_DEPRECIATION for kernel in kernels]
+        self.kind: np.ndarray = np.array([kernel.kind for kernel in kernels], dtype=object)
+        self.base: np.ndarray = np.array([kernel.base for kernel in kernels], dtype=np.float64)
+        self.factor: np.ndarray = np.array([kernel.factor for kernel in kernels], dtype=np.float64)
+        self.period_dates: List[date] = list(period_dates)
+
+    @classmethod
+    def from_assets(cls, assets: Iterable, period_dates: Sequence[date]) -> 'BatchDepreciation':
+        return cls(compile_kernels(assets), period_dates)
+
+    @classmethod
+    def from_columns(cls, assets: Dict[str, Sequence], period_dates: Sequence[date]) -> 'BatchDepreciation':
+        rows: List[dict] = [dict(zip(DEPRECIATION_INPUTS, values))
+                            for values in zip(*(assets[key] for key in DEPRECIATION_INPUTS))]
+        return cls([compile_kernel(AssetParams.create(None, **row)) for row in rows], period_dates)
+
+    def calculate_depreciation(self) -> np.ndarray:
+        shape = (self.base.size, len(self.period_dates))
+        if not shape[0] or not shape[1]:
+            return np.zeros(shape)
+        days_in_year, days_in_month = period_day_counts(self.period_dates)
+        # Assets are rows, periods are columns
+        column = (slice(None), np.newaxis)
+        base: np.ndarray = self.base[column]
+        kind: np.ndarray = self.kind[column]
+        result: np.ndarray = np.where(kind == PER_DAY, base / (days_in_year * days_in_month),
+                                      np.where(kind == PRORATED, (base / days_in_year) * days_in_month,
+                                               np.broadcast_to(base, shape)))
+        return round_2(result * self.factor[column])
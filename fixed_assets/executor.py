@@ -0,0 +1,44 @@
+from datetime import date
+from itertools import repeat
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+
+from xero_assets.settings import (DEPRECIATION_RUN_WORKERS, DEPRECIATION_RUN_CHUNK_SIZE,
+                                  DEPRECIATION_RUN_PARALLEL_THRESHOLD)
+from .engine import BatchDepreciation
+from .processes import get_process_pool
+from .utils import Kernel, NO_DEPRECIATION
+
+
+def calculate_chunk(kernels: List[Tuple[str, float, float]], period_dates: List[date]) -> np.ndarray:
+    # Runs in a worker process : plain (kind, base, factor) tuples in, assets x periods matrix out
+    return BatchDepreciation([Kernel(*kernel) for kernel in kernels], period_dates).calculate_depreciation()
+
+
+class RunExecutor:
+    """Computes the depreciation matrix of a run, split in chunks of assets across worker processes.
+
+    Portfolios under the parallel threshold (or a single worker) are computed in-process.
+    """
+
+    def __init__(self, workers: Union[int, None] = None, chunk_size: Union[int, None] = None,
+                 parallel_threshold: Union[int, None] = None):
+        self.workers: int = workers or DEPRECIATION_RUN_WORKERS
+        self.chunk_size: int = chunk_size or DEPRECIATION_RUN_CHUNK_SIZE
+        self.parallel_threshold: int = (DEPRECIATION_RUN_PARALLEL_THRESHOLD if parallel_threshold is None
+                                        else parallel_threshold)
+
+    def is_parallel(self, assets_count: int) -> bool:
+        return self.workers > 1 and assets_count > self.chunk_size and assets_count >= self.parallel_threshold
+
+    def calculate_depreciation(self, kernels: Sequence[Union[Kernel, None]],
+                               period_dates: Sequence[date]) -> np.ndarray:
+        if not period_dates or not self.is_parallel(len(kernels)):
+            return BatchDepreciation(kernels, period_dates).calculate_depreciation()
+        # Assets without kernel (ND) are not depreciated
+        rows: List[Tuple[str, float, float]] = [(kernel.kind, kernel.base, kernel.factor) for kernel in
+                                                (kernel or NO_DEPRECIATION for kernel in kernels)]
+        chunks: List[list] = [rows[index:index + self.chunk_size] for index in range(0, len(rows), self.chunk_size)]
+        with get_process_pool(min(self.workers, len(chunks))) as pool:
+            return np.vstack(list(pool.map(calculate_chunk, chunks, repeat(list(period_dates)))))
@@ -0,0 +1,79 @@
+from typing import List, Union
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from django.db.models import QuerySet, Count, Q
+
+from fixed_assets.models import DepreciationRun, DepreciationWorkUnit
+from fixed_assets.runs import cancel_run, claim_unit, get_worker_name, plan_run, process_unit, resume_run
+
+
+class Command(BaseCommand):
+    help = 'List, resume or cancel depreciation runs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=('list', 'resume', 'cancel'))
+        parser.add_argument('run_pks', nargs='*', type=int)
+        parser.add_argument('--status', choices=[choice for choice, _ in DepreciationRun._meta.get_field(
+            'status').choices], help='list : only the runs with this status')
+        parser.add_argument('--user', help='list : only the runs of this user email')
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument('--inline', action='store_true',
+                            help='resume : compute the units in this process instead of the depreciation_worker')
+
+    def list_runs(self, options: dict) -> None:
+        runs: QuerySet = DepreciationRun.objects.select_related('user').annotate(
+            units=Count('work_unit_run'), units_done=Count('work_unit_run', filter=Q(work_unit_run__status='DO'))
+        ).order_by('-pk')
+        if options['status']:
+            runs = runs.filter(status=options['status'])
+        if options['user']:
+            runs = runs.filter(user__email=options['user'])
+        for run in runs[:options['limit']]:
+            self.stdout.write('{:>6} {:<10} {:<30} to {} {:>6}% {}/{} assets, {}/{} units, {} error(s)'.format(
+                run.pk, run.get_status_display(), str(run.user), run.to_date, run.percent_done,
+                run.assets_processed, run.assets_total, run.units_done, run.units, len(run.errors)))
+
+    def get_runs(self, run_pks: List[int]) -> List[DepreciationRun]:
+        if not run_pks:
+            raise CommandError('Give the pk of the runs')
+        runs: List[DepreciationRun] = list(DepreciationRun.objects.filter(pk__in=run_pks).order_by('pk'))
+        missing: List[int] = sorted(set(run_pks) - {run.pk for run in runs})
+        if missing:
+            raise CommandError('Depreciation runs do not exist: {}'.format(missing))
+        return runs
+
+    def resume_inline(self, run: DepreciationRun) -> None:
+        worker: str = get_worker_name()
+        if run.status == 'QU':
+            plan_run(worker, run=run)
+        # Units claimed by a worker in the meantime are left to it
+        unit: Union[DepreciationWorkUnit, None] = claim_unit(worker, run=run)
+        while unit is not None:
+            process_unit(unit)
+            unit = claim_unit(worker, run=run)
+        run.refresh_from_db()
+        self.stdout.write('Run {} {} : {}/{} assets'.format(run.pk, run.get_status_display(),
+                                                           run.assets_processed, run.assets_total))
+
+    def handle(self, *args, **options):
+        if options['action'] == 'list':
+            return self.list_runs(options)
+        for run in self.get_runs(options['run_pks']):
+            if run.status == 'DO':
+                self.stdout.write(self.style.WARNING('Run {} is done'.format(run.pk)))
+                continue
+            if options['action'] == 'cancel':
+                cancel_run(run)
+                self.stdout.write('Run {} cancelled'.format(run.pk))
+                continue
+            try:
+                resume_run(run)
+            except IntegrityError:
+                self.stderr.write('Run {} : another run of this user to {} is queued or running'.format(
+                    run.pk, run.to_date))
+                continue
+            if not options['inline']:
+                self.stdout.write('Run {} queued again'.format(run.pk))
+                continue
+            self.resume_inline(run)
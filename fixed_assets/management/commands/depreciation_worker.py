@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from time import sleep
+from typing import Set, Union
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from xero_assets.settings import DEPRECIATION_WORKER_CONCURRENCY, DEPRECIATION_WORKER_POLL_INTERVAL
+from fixed_assets.models import DepreciationRun, DepreciationWorkUnit
+from fixed_assets.runs import claim_unit, get_worker_name, plan_run, process_unit
+
+
+def process_unit_thread(unit: DepreciationWorkUnit) -> DepreciationWorkUnit:
+    try:
+        return process_unit(unit)
+    finally:
+        # Each thread has its own database connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = ('Split the queued depreciation runs in work units and compute the units, --concurrency at a time. '
+            'Any number of workers, on any node, can share the same queue.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=DEPRECIATION_WORKER_CONCURRENCY)
+        parser.add_argument('--poll-interval', type=float, default=DEPRECIATION_WORKER_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def report(self, future: Future) -> None:
+        unit: DepreciationWorkUnit = future.result()
+        message: str = 'Run {} assets {}-{} {} : {} assets, {} rows'.format(
+            unit.run_id, unit.first_asset_pk, unit.last_asset_pk, unit.get_status_display(),
+            unit.assets_processed, unit.rows_written)
+        self.stdout.write(self.style.SUCCESS(message) if unit.status == 'DO' else self.style.ERROR(message))
+
+    def handle(self, *args, **options):
+        concurrency: int = max(options['concurrency'], 1)
+        worker: str = get_worker_name()
+        active: Set[Future] = set()
+        self.stdout.write('Worker {} processing up to {} units'.format(worker, concurrency))
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                # Split the queued runs
+                while True:
+                    run: Union[DepreciationRun, None] = plan_run(worker)
+                    if run is None:
+                        break
+                    self.stdout.write('Run {} planned ({} to {}, {} assets)'.format(run.pk, run.user, run.to_date,
+                                                                                   run.assets_total))
+                # Claim units while a slot is free
+                while len(active) < concurrency:
+                    unit: Union[DepreciationWorkUnit, None] = claim_unit(worker)
+                    if unit is None:
+                        break
+                    active.add(pool.submit(process_unit_thread, unit))
+                if not active:
+                    if options['once']:
+                        break
+                    sleep(options['poll_interval'])
+                    continue
+                done, active = wait(active, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.report(future)
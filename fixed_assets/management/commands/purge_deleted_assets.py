@@ -0,0 +1,32 @@
+from time import sleep
+from typing import List
+
+from django.core.management.base import BaseCommand
+
+from xero_assets.settings import ASSET_PURGE_BATCH_SIZE, ASSET_PURGE_INTERVAL
+from fixed_assets.models import Asset
+from fixed_assets.writers import delete_assets
+
+
+class Command(BaseCommand):
+    help = ('Purge the deleted assets with their schedules and disposals, --batch-size assets per transaction, '
+            'waiting --interval seconds between two batches to keep the lock windows short.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ASSET_PURGE_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=ASSET_PURGE_INTERVAL)
+        parser.add_argument('--once', action='store_true', help='Exit once every deleted asset is purged')
+
+    def handle(self, *args, **options):
+        batch_size: int = max(options['batch_size'], 1)
+        purged: int = 0
+        while True:
+            asset_pks: List[int] = list(Asset.all_objects.exclude(deleted_at=None).order_by('pk')
+                                        .values_list('pk', flat=True)[:batch_size])
+            if asset_pks:
+                purged += delete_assets(Asset.all_objects.filter(pk__in=asset_pks), chunk_size=batch_size)
+                self.stdout.write('{} assets purged'.format(purged))
+            elif options['once']:
+                break
+            sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('{} assets purged'.format(purged)))
@@ -0,0 +1,159 @@
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+from time import perf_counter
+from typing import Dict, Iterator, List, Set, Tuple, Union
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import QuerySet
+
+from xero_assets.settings import DEPRECIATION_WORKER_CONCURRENCY
+from fixed_assets.executor import RunExecutor
+from fixed_assets.models import Asset, AssetSetting
+from fixed_assets.periods import parse_date
+from fixed_assets.processes import get_process_pool
+from fixed_assets.runs import DepreciationRunner, RunDiff
+
+
+class Tenant:
+    def __init__(self, runner: DepreciationRunner):
+        self.runner: DepreciationRunner = runner
+        self.batches: Iterator[List[Asset]] = runner.get_batches()
+        self.exhausted: bool = False
+        self.in_flight: int = 0
+        self.assets: int = 0
+        self.rows: int = 0
+        self.seconds: float = 0.0
+        self.errors: List[str] = []
+        self.diff: RunDiff = RunDiff()
+
+
+def run_batch(runner: DepreciationRunner, batch: List[Asset], dry_run: bool) -> Tuple[Union[int, RunDiff], float]:
+    # Runs in a worker process : rows written, or the changes of the batch for a dry run
+    started: float = perf_counter()
+    if dry_run:
+        result: Union[int, RunDiff] = RunDiff().add(*runner.calculate_batch(batch))
+    else:
+        with transaction.atomic():
+            result = runner.run_batch(batch)
+    return result, perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ('Run the depreciation of the registered assets of every user (or --users) up to --to-date. '
+            'Batches of all the users share --workers processes, one user gets at most --max-per-user of them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to-date', required=True, help='YYYY-MM-DD, excluded')
+        parser.add_argument('--users', nargs='*', default=None,
+                            help='Emails, every user with asset settings by default')
+        parser.add_argument('--workers', type=int, default=DEPRECIATION_WORKER_CONCURRENCY)
+        parser.add_argument('--max-per-user', type=int, default=None,
+                            help='Fairness cap : batches of one user computed at the same time, workers / 2 by default')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--incremental', action='store_true')
+        parser.add_argument('--dry-run', action='store_true', help='Print the changes of the run, write nothing')
+        parser.add_argument('--slowest', type=int, default=5, help='Slowest users listed in the summary')
+
+    def get_tenants(self, options: dict) -> List[Tenant]:
+        asset_settings: QuerySet = (AssetSetting.objects.select_related('user').exclude(start_date=None)
+                                    .order_by('user__pk'))
+        if options['users'] is not None:
+            asset_settings = asset_settings.filter(user__email__in=options['users'])
+            missing: Set[str] = set(options['users']) - {asset_setting.user.email for asset_setting in asset_settings}
+            if missing:
+                raise CommandError('Asset setting for these users do not exist: {}'.format(sorted(missing)))
+        # Batches run side by side in worker processes, each batch is computed in its worker
+        executor: RunExecutor = RunExecutor(workers=1)
+        return [Tenant(DepreciationRunner(asset_setting.user, options['to_date'], incremental=options['incremental'],
+                                          batch_size=options['batch_size'], executor=executor,
+                                          start_date=asset_setting.start_date))
+                for asset_setting in asset_settings]
+
+    @staticmethod
+    def next_batch(tenants: List[Tenant], max_per_user: int, start: int) -> Tuple[int, Tenant, List[Asset]]:
+        # Round robin from tenants[start], skipping the users at their cap
+        for index in range(start, start + len(tenants)):
+            tenant: Tenant = tenants[index % len(tenants)]
+            if tenant.exhausted or tenant.in_flight >= max_per_user:
+                continue
+            batch: List[Asset] = next(tenant.batches, [])
+            if not batch:
+                tenant.exhausted = True
+                continue
+            return index + 1, tenant, batch
+        return start, None, None
+
+    def handle(self, *args, **options):
+        try:
+            options['to_date'] = parse_date(options['to_date'])
+        except ValueError:
+            raise CommandError('--to-date has wrong format. Use YYYY-MM-DD.')
+        workers: int = max(options['workers'], 1)
+        max_per_user: int = max(options['max_per_user'] or workers // 2, 1)
+        tenants: List[Tenant] = self.get_tenants(options)
+        self.stdout.write('{} users to {}, {} workers, at most {} per user'.format(
+            len(tenants), options['to_date'], workers, max_per_user))
+        started: float = perf_counter()
+        active: Dict[Future, Tuple[Tenant, int]] = {}
+        position: int = 0
+        # Writing the schedules is mostly Python (model instances, SQL compilation) holding the GIL, threads do not
+        # scale on it
+        with get_process_pool(workers) as pool:
+            while True:
+                while len(active) < workers:
+                    position, tenant, batch = self.next_batch(tenants, max_per_user, position)
+                    if tenant is None:
+                        break
+                    tenant.in_flight += 1
+                    active[pool.submit(run_batch, tenant.runner, batch, options['dry_run'])] = (tenant, len(batch))
+                if not active:
+                    break
+                done, _ = wait(list(active), return_when=FIRST_COMPLETED)
+                for future in done:
+                    tenant, assets = active.pop(future)
+                    tenant.in_flight -= 1
+                    try:
+                        result, seconds = future.result()
+                    except Exception as e:
+                        tenant.errors.append('{}: {}'.format(type(e).__name__, e))
+                        continue
+                    if options['dry_run']:
+                        tenant.diff.merge(result)
+                        result = result.totals['rows_added']
+                    tenant.assets += assets
+                    tenant.rows += result
+                    tenant.seconds += seconds
+        if options['dry_run']:
+            self.dry_run_summary(tenants)
+        self.summary(tenants, perf_counter() - started, options['slowest'])
+
+    def dry_run_summary(self, tenants: List[Tenant]) -> None:
+        for tenant in tenants:
+            totals: dict = tenant.diff.load_asset_types().to_dict()['totals']
+            self.stdout.write('{} : {} of {} assets changed, rows +{} ~{} -{}, depreciation {} -> {}, '
+                              'book value {} -> {}'.format(
+                                  tenant.runner.user, totals['assets_changed'], totals['assets'], totals['rows_added'],
+                                  totals['rows_changed'], totals['rows_removed'], totals['depreciation_before'],
+                                  totals['depreciation_after'], totals['book_value_before'],
+                                  totals['book_value_after']))
+            for asset_type in tenant.diff.to_dict()['asset_types']:
+                self.stdout.write('  {} ({}) : {} assets, depreciation {} -> {}, book value {} -> {}'.format(
+                    asset_type.get('asset_type'), asset_type.get('depreciation_expense_account'),
+                    asset_type['assets'], asset_type['depreciation_before'], asset_type['depreciation_after'],
+                    asset_type['book_value_before'], asset_type['book_value_after']))
+        self.stdout.write('Dry run, nothing was written')
+
+    def summary(self, tenants: List[Tenant], elapsed: float, slowest: int) -> None:
+        assets: int = sum(tenant.assets for tenant in tenants)
+        rows: int = sum(tenant.rows for tenant in tenants)
+        elapsed = max(elapsed, 1e-9)
+        self.stdout.write('{} assets, {} rows in {:.2f}s : {:.0f} assets/s, {:.0f} rows/s'.format(
+            assets, rows, elapsed, assets / elapsed, rows / elapsed))
+        for tenant in sorted(tenants, key=lambda tenant: tenant.seconds, reverse=True)[:slowest]:
+            self.stdout.write('  {:<40} {:>8} assets {:>10} rows {:>8.2f}s'.format(
+                str(tenant.runner.user), tenant.assets, tenant.rows, tenant.seconds))
+        failed: List[Tenant] = [tenant for tenant in tenants if tenant.errors]
+        for tenant in failed:
+            self.stdout.write(self.style.ERROR('  {} : {}'.format(tenant.runner.user, '; '.join(tenant.errors))))
+        if failed:
+            raise CommandError('{} users failed'.format(len(failed)))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-17 17:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fixed_assets', '0017_disposedasset_disposal_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='depreciation_fingerprint',
+            field=models.CharField(blank=True, default=None, max_length=40, null=True, verbose_name='Depreciation fingerprint'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.8 on 2026-10-17 17:39
+
+from django.db import migrations, models
+from django.db.models import Sum, Max, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_depreciation_summary(apps, schema_editor):
+    Asset = apps.get_model('fixed_assets', 'Asset')
+    CalculatedDepreciation = apps.get_model('fixed_assets', 'CalculatedDepreciation')
+    calculated_depreciations = CalculatedDepreciation.objects.filter(asset=OuterRef('pk')).order_by().values('asset')
+    Asset.objects.update(
+        accumulated_depreciation=Coalesce(Subquery(calculated_depreciations.annotate(
+            total=Sum('depreciation_of')).values('total')), 0.0),
+        depreciated_to=Subquery(calculated_depreciations.annotate(last=Max('depreciation_date')).values('last')),
+        depreciation_rows=Coalesce(Subquery(calculated_depreciations.annotate(
+            count=Count('pk')).values('count')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fixed_assets', '0018_asset_depreciation_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='accumulated_depreciation',
+            field=models.FloatField(default=0, verbose_name='Accumulated depreciation'),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='depreciated_to',
+            field=models.DateField(blank=True, default=None, null=True, verbose_name='Depreciated to'),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='depreciation_rows',
+            field=models.PositiveIntegerField(default=0, verbose_name='Depreciation rows'),
+        ),
+        migrations.RunPython(backfill_depreciation_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.8 on 2026-10-17 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fixed_assets', '0019_asset_depreciation_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calculateddepreciation',
+            name='accumulated_depreciation',
+            field=models.FloatField(blank=True, null=True, verbose_name='Accumulated depreciation'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE fixed_assets_calculateddepreciation AS calculated_depreciation
+                SET accumulated_depreciation = running.total
+                FROM (SELECT id, SUM(depreciation_of) OVER (PARTITION BY asset_id ORDER BY depreciation_date) AS total
+                      FROM fixed_assets_calculateddepreciation) AS running
+                WHERE calculated_depreciation.id = running.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
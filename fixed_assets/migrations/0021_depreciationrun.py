@@ -0,0 +1,38 @@
+# Generated by Django 4.2.8 on 2026-10-17 17:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('fixed_assets', '0020_calculateddepreciation_accumulated_depreciation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepreciationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('to_date', models.DateField(verbose_name='To Date')),
+                ('incremental', models.BooleanField(default=False, verbose_name='Incremental')),
+                ('status', models.CharField(choices=[('QU', 'Queued'), ('RU', 'Running'), ('DO', 'Done'), ('FA', 'Failed')], default='QU', max_length=2, verbose_name='Status')),
+                ('assets_total', models.PositiveIntegerField(default=0, verbose_name='Assets total')),
+                ('assets_processed', models.PositiveIntegerField(default=0, verbose_name='Assets processed')),
+                ('rows_written', models.PositiveIntegerField(default=0, verbose_name='Rows written')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Errors')),
+                ('worker', models.CharField(blank=True, default=None, max_length=255, null=True, verbose_name='Worker')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('started_at', models.DateTimeField(blank=True, default=None, null=True, verbose_name='Started at')),
+                ('finished_at', models.DateTimeField(blank=True, default=None, null=True, verbose_name='Finished at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='depreciation_run_user', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Depreciation Run',
+                'verbose_name_plural': 'Depreciation Runs',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-17 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fixed_assets', '0021_depreciationrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='depreciationrun',
+            name='start_date',
+            field=models.DateField(blank=True, default=None, null=True, verbose_name='Start Date'),
+        ),
+        migrations.AlterField(
+            model_name='depreciationrun',
+            name='status',
+            field=models.CharField(choices=[('QU', 'Queued'), ('RU', 'Running'), ('DO', 'Done'), ('FA', 'Failed'), ('CA', 'Cancelled')], default='QU', max_length=2, verbose_name='Status'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fixed_assets', '0022_depreciationrun_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepreciationWorkUnit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_asset_pk', models.PositiveIntegerField(verbose_name='First asset pk')),
+                ('last_asset_pk', models.PositiveIntegerField(verbose_name='Last asset pk')),
+                ('status', models.CharField(choices=[('QU', 'Queued'), ('RU', 'Running'), ('DO', 'Done'), ('FA', 'Failed'), ('CA', 'Cancelled')], default='QU', max_length=2, verbose_name='Status')),
+                ('worker', models.CharField(blank=True, default=None, max_length=255, null=True, verbose_name='Worker')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('heartbeat_at', models.DateTimeField(blank=True, default=None, null=True, verbose_name='Heartbeat at')),
+                ('lease_expires_at', models.DateTimeField(blank=True, default=None, null=True, verbose_name='Lease expires at')),
+                ('assets_processed', models.PositiveIntegerField(default=0, verbose_name='Assets processed')),
+                ('rows_written', models.PositiveIntegerField(default=0, verbose_name='Rows written')),
+                ('error', models.TextField(blank=True, default=None, null=True, verbose_name='Error')),
+                ('finished_at', models.DateTimeField(blank=True, default=None, null=True, verbose_name='Finished at')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='work_unit_run', to='fixed_assets.depreciationrun', verbose_name='Run')),
+            ],
+            options={
+                'verbose_name': 'Depreciation Work Unit',
+                'verbose_name_plural': 'Depreciation Work Units',
+                'indexes': [models.Index(fields=['status', 'lease_expires_at'], name='work_unit_claim_idx')],
+            },
+        ),
+    ]
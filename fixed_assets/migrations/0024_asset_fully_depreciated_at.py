@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fixed_assets', '0023_depreciationworkunit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='fully_depreciated_at',
+            field=models.DateField(blank=True, db_index=True, default=None, null=True, verbose_name='Fully depreciated at'),
+        ),
+    ]
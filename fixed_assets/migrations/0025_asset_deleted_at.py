@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fixed_assets', '0024_asset_fully_depreciated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, default=None, null=True, verbose_name='Deleted at'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fixed_assets', '0025_asset_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='calculateddepreciation',
+            constraint=models.UniqueConstraint(fields=('asset', 'depreciation_date'), include=('depreciation_of',), name='depreciation_asset_date_uniq'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='calculateddepreciation',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='calculateddepreciation',
+            name='asset',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='calculated_depreciation_asset', to='fixed_assets.asset', verbose_name='Asset'),
+        ),
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(condition=models.Q(('deleted_at', None)), fields=['user', 'asset_status', '-id'], name='asset_user_status_idx'),
+        ),
+    ]
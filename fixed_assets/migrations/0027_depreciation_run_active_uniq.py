@@ -0,0 +1,29 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:51
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+
+def cancel_duplicate_runs(apps, schema_editor):
+    # Only the oldest queued or running run of a user, to_date and mode is kept
+    DepreciationRun = apps.get_model('fixed_assets', 'DepreciationRun')
+    active_runs = DepreciationRun.objects.filter(status__in=('QU', 'RU'))
+    older_runs = active_runs.filter(user=OuterRef('user'), to_date=OuterRef('to_date'),
+                                    incremental=OuterRef('incremental'), pk__lt=OuterRef('pk'))
+    active_runs.filter(Exists(older_runs)).update(status='CA', finished_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fixed_assets', '0026_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_runs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='depreciationrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['QU', 'RU'])), fields=('user', 'to_date', 'incremental'), name='depreciation_run_active_uniq'),
+        ),
+    ]
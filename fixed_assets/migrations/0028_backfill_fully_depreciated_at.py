@@ -0,0 +1,25 @@
+# Generated by Django 4.2.8 on 2026-10-17 19:20
+
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Coalesce, Floor
+
+
+def backfill_fully_depreciated_at(apps, schema_editor):
+    # As writers.refresh_depreciation_summary : last posted period once the total reached the depreciable amount
+    Asset = apps.get_model('fixed_assets', 'Asset')
+    depreciable_amount = Floor(Coalesce('purchase_price', 0.0)) - Coalesce('residual_value', 0.0)
+    (Asset.objects.exclude(depreciated_to=None)
+     .filter(accumulated_depreciation__gte=depreciable_amount - 0.005)
+     .update(fully_depreciated_at=F('depreciated_to')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fixed_assets', '0027_depreciation_run_active_uniq'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_fully_depreciated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-17 19:04
+
+from datetime import date
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_year_start_accumulated_depreciation(apps, schema_editor):
+    # As writers.refresh_depreciation_summary : running total of the last row before 1 January
+    Asset = apps.get_model('fixed_assets', 'Asset')
+    CalculatedDepreciation = apps.get_model('fixed_assets', 'CalculatedDepreciation')
+    year_start = date.today().replace(month=1, day=1)
+    Asset.objects.update(
+        year_start_accumulated_depreciation=Coalesce(Subquery(
+            CalculatedDepreciation.objects.filter(asset=OuterRef('pk'), depreciation_date__lt=year_start)
+            .order_by('-depreciation_date').values('accumulated_depreciation')[:1]), 0.0),
+        ytd_year=year_start.year,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fixed_assets', '0028_backfill_fully_depreciated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='year_start_accumulated_depreciation',
+            field=models.FloatField(default=0, verbose_name='Year start accumulated depreciation'),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='ytd_year',
+            field=models.PositiveIntegerField(blank=True, default=None, null=True, verbose_name='YTD year'),
+        ),
+        migrations.RunPython(backfill_year_start_accumulated_depreciation, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,8 @@
 from auth.models import CustomUser
-from django.db.models import (Model, CharField, ForeignKey,
+from django.db.models import (Model, Manager, QuerySet, CharField, ForeignKey,
                               CASCADE, OneToOneField, IntegerField,
-                              FloatField, PositiveIntegerField, TextField, DateField, SET_NULL)
+                              FloatField, PositiveIntegerField, TextField, DateField, SET_NULL,
+                              BooleanField, DateTimeField, JSONField, Index, UniqueConstraint, Q)
 
 
 # class Region(Model):
@@ -49,6 +50,13 @@ class AccountType:
         ('DR', 'Draft'),
         ('DI', 'Disposed'),
     )
+    RUN_STATUS_CHOICES = (
+        ('QU', 'Queued'),
+        ('RU', 'Running'),
+        ('DO', 'Done'),
+        ('FA', 'Failed'),
+        ('CA', 'Cancelled'),
+    )
     # TODO needs to be seperated
     REGION_CHOICES = (
         ('E', 'East Side'),
@@ -118,6 +126,12 @@ class AssetType(Model):
         verbose_name_plural = 'Asset Types'
 
 
+class AssetManager(Manager):
+    # Deleted assets are hidden until purge_deleted_assets removes them
+    def get_queryset(self) -> QuerySet:
+        return super().get_queryset().filter(deleted_at=None)
+
+
 class Asset(Model):
     user = ForeignKey(CustomUser, on_delete=CASCADE, verbose_name='User', related_name="asset_user")
     asset_name = CharField(verbose_name='Asset Name', max_length=255, null=True, default=None, blank=True)
@@ -142,6 +156,26 @@ class Asset(Model):
     asset_status = CharField(verbose_name='Asset Status', choices=AccountType.STATUS_CHOICES, default='RE',
                              max_length=2)
     book_value = FloatField(verbose_name='Book value', blank=True, null=True, default=0)
+    # Inputs the posted depreciation schedule was computed from (see engine.inputs_fingerprint)
+    depreciation_fingerprint = CharField(verbose_name='Depreciation fingerprint', max_length=40,
+                                         null=True, blank=True, default=None)
+    # Depreciation summary, kept up-to-date by writers.refresh_depreciation_summary
+    accumulated_depreciation = FloatField(verbose_name='Accumulated depreciation', default=0)
+    depreciated_to = DateField(verbose_name='Depreciated to', null=True, blank=True, default=None)
+    depreciation_rows = PositiveIntegerField(verbose_name='Depreciation rows', default=0)
+    # Running total at the end of the year before ytd_year, the YTD depreciation is the difference
+    # (see utils.annotate_ytd_depreciation)
+    year_start_accumulated_depreciation = FloatField(verbose_name='Year start accumulated depreciation', default=0)
+    ytd_year = PositiveIntegerField(verbose_name='YTD year', null=True, blank=True, default=None)
+    # Last posted period once the book value reached the residual value, later runs skip the asset
+    fully_depreciated_at = DateField(verbose_name='Fully depreciated at', null=True, blank=True, default=None,
+                                     db_index=True)
+    # Soft delete, the asset and its rows are purged later by purge_deleted_assets
+    deleted_at = DateTimeField(verbose_name='Deleted at', null=True, blank=True, default=None, db_index=True)
+
+    objects = AssetManager()
+    # Deleted assets included
+    all_objects = Manager()
 
     def __str__(self):
         return '{} - {} - {}'.format(self.asset_name, self.rate, self.effective_life)
@@ -149,12 +183,20 @@ class Asset(Model):
     class Meta:
         verbose_name = 'Asset'
         verbose_name_plural = 'Assets'
+        indexes = [
+            # Lists, counts and runs : assets of a user by status, newest first (AssetManager rows only)
+            Index(fields=['user', 'asset_status', '-id'], condition=Q(deleted_at=None), name='asset_user_status_idx'),
+        ]
 
 
 class CalculatedDepreciation(Model):
-    asset = ForeignKey(Asset, on_delete=CASCADE, verbose_name='Asset', related_name="calculated_depreciation_asset")
+    # Asset lookups use the unique index below
+    asset = ForeignKey(Asset, on_delete=CASCADE, verbose_name='Asset', related_name="calculated_depreciation_asset",
+                       db_index=False)
     depreciation_of = FloatField(verbose_name='Depreciation of', blank=True, null=True)
     depreciation_date = DateField(verbose_name='Depreciation Date', null=True, blank=True)
+    # Running total of depreciation_of up to and including this row
+    accumulated_depreciation = FloatField(verbose_name='Accumulated depreciation', blank=True, null=True)
 
     def __str__(self):
         return '{} - {} - {}'.format(self.asset.asset_name, self.depreciation_of, self.depreciation_date)
@@ -162,7 +204,11 @@ class CalculatedDepreciation(Model):
     class Meta:
         verbose_name = 'Calculated Depreciation'
         verbose_name_plural = 'Calculated Depreciations'
-        unique_together = (('asset', 'depreciation_date'),)
+        constraints = [
+            # Date ranges, last dates and sums of an asset's schedule are answered from the index alone
+            UniqueConstraint(fields=['asset', 'depreciation_date'], include=['depreciation_of'],
+                             name='depreciation_asset_date_uniq'),
+        ]
 
 
 class DisposedAsset(Model):
@@ -189,3 +235,70 @@ class DisposedAsset(Model):
     class Meta:
         verbose_name = 'Disposed Asset'
         verbose_name_plural = 'Disposed Assets'
+
+
+class DepreciationRun(Model):
+    # Run queued by asset-run-depreciation/, split in DepreciationWorkUnit by the depreciation_worker command
+    user = ForeignKey(CustomUser, on_delete=CASCADE, verbose_name='User', related_name='depreciation_run_user')
+    to_date = DateField(verbose_name='To Date')
+    incremental = BooleanField(verbose_name='Incremental', default=False)
+    # Settings start date the run was started with, a resumed run keeps it
+    start_date = DateField(verbose_name='Start Date', null=True, blank=True, default=None)
+    status = CharField(verbose_name='Status', choices=AccountType.RUN_STATUS_CHOICES, default='QU', max_length=2)
+    assets_total = PositiveIntegerField(verbose_name='Assets total', default=0)
+    assets_processed = PositiveIntegerField(verbose_name='Assets processed', default=0)
+    rows_written = PositiveIntegerField(verbose_name='Rows written', default=0)
+    errors = JSONField(verbose_name='Errors', default=list, blank=True)
+    worker = CharField(verbose_name='Worker', max_length=255, null=True, blank=True, default=None)
+    created_at = DateTimeField(verbose_name='Created at', auto_now_add=True)
+    started_at = DateTimeField(verbose_name='Started at', null=True, blank=True, default=None)
+    finished_at = DateTimeField(verbose_name='Finished at', null=True, blank=True, default=None)
+
+    @property
+    def percent_done(self) -> float:
+        if self.status == 'DO':
+            return 100.0
+        if not self.assets_total:
+            return 0.0
+        return round(self.assets_processed * 100 / self.assets_total, 2)
+
+    def __str__(self):
+        return '{} - {} - {}'.format(self.user, self.to_date, self.status)
+
+    class Meta:
+        verbose_name = 'Depreciation Run'
+        verbose_name_plural = 'Depreciation Runs'
+        constraints = [
+            # One queued or running run per user, to_date and mode
+            UniqueConstraint(fields=['user', 'to_date', 'incremental'], condition=Q(status__in=['QU', 'RU']),
+                             name='depreciation_run_active_uniq'),
+        ]
+
+
+class DepreciationWorkUnit(Model):
+    # Registered assets [first_asset_pk, last_asset_pk] of the run user, computed up to the run to_date.
+    # Claimed by any depreciation_worker, the lease is renewed by its heartbeat while the unit is computed.
+    run = ForeignKey(DepreciationRun, on_delete=CASCADE, verbose_name='Run', related_name='work_unit_run')
+    first_asset_pk = PositiveIntegerField(verbose_name='First asset pk')
+    last_asset_pk = PositiveIntegerField(verbose_name='Last asset pk')
+    status = CharField(verbose_name='Status', choices=AccountType.RUN_STATUS_CHOICES, default='QU', max_length=2)
+    worker = CharField(verbose_name='Worker', max_length=255, null=True, blank=True, default=None)
+    attempts = PositiveIntegerField(verbose_name='Attempts', default=0)
+    heartbeat_at = DateTimeField(verbose_name='Heartbeat at', null=True, blank=True, default=None)
+    lease_expires_at = DateTimeField(verbose_name='Lease expires at', null=True, blank=True, default=None)
+    assets_processed = PositiveIntegerField(verbose_name='Assets processed', default=0)
+    rows_written = PositiveIntegerField(verbose_name='Rows written', default=0)
+    error = TextField(verbose_name='Error', null=True, blank=True, default=None)
+    finished_at = DateTimeField(verbose_name='Finished at', null=True, blank=True, default=None)
+
+    def get_lease(self):
+        # This claim of the unit, empty once the lease expired and the unit was claimed again
+        return DepreciationWorkUnit.objects.filter(pk=self.pk, status='RU', worker=self.worker, attempts=self.attempts)
+
+    def __str__(self):
+        return '{} - {}-{} - {}'.format(self.run_id, self.first_asset_pk, self.last_asset_pk, self.status)
+
+    class Meta:
+        verbose_name = 'Depreciation Work Unit'
+        verbose_name_plural = 'Depreciation Work Units'
+        indexes = [Index(fields=['status', 'lease_expires_at'], name='work_unit_claim_idx')]
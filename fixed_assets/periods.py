@@ -0,0 +1,43 @@
+from calendar import isleap, monthrange
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import List, Tuple, Union
+
+
+def parse_date(value: Union[date, str]) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def month_end(date_: date) -> date:
+    return date(date_.year, date_.month, monthrange(date_.year, date_.month)[1])
+
+
+def days_in_year(date_: date) -> int:
+    return 365 + isleap(date_.year)
+
+
+def days_in_period(period_date: date) -> int:
+    # Days the AD averaging method counts for a period running from the 1st to period_date
+    # (see utils.Init.number_of_days_in_month)
+    return max(period_date.day - 1, 1)
+
+
+@lru_cache(maxsize=256)
+def _month_ends(start: date, end: date) -> Tuple[date, ...]:
+    if end <= start:
+        return ()
+    last_day: date = end - timedelta(days=1)
+    months: int = (last_day.year - start.year) * 12 + last_day.month - start.month + 1
+    return tuple(month_end(date((start.year * 12 + start.month - 1 + month) // 12,
+                                (start.month - 1 + month) % 12 + 1, 1))
+                 for month in range(months))
+
+
+def get_month_ends(from_date: Union[date, str], to_date: Union[date, str]) -> List[date]:
+    # Last day of every month having at least one day in [from_date, to_date), to_date excluded
+    return list(_month_ends(parse_date(from_date), parse_date(to_date)))
+
@@ -0,0 +1,20 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.util import Finalize
+
+import django
+from django.db import connections
+
+
+# Imported by the spawned workers before Django is set up : no models here
+
+def setup_worker() -> None:
+    django.setup()
+    # A worker keeps its database connection for all its tasks. Pool workers exit without running atexit,
+    # the connection is closed once, by a multiprocessing finalizer.
+    Finalize(None, connections.close_all, exitpriority=0)
+
+
+def get_process_pool(workers: int) -> ProcessPoolExecutor:
+    # Spawned workers do not inherit the database connections of the parent
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'), initializer=setup_worker)
@@ -0,0 +1,539 @@
+import socket
+import traceback
+from bisect import bisect_right
+from datetime import date, timedelta
+from itertools import islice
+from os import getpid
+from threading import Event, Thread
+from typing import Any, Dict, Iterator, List, Sequence, Set, Tuple, Union
+
+import numpy as np
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet, Max, F, Q
+from django.utils import timezone
+
+from xero_assets.settings import (DEPRECIATION_APPLY_SYNC_LIMIT, DEPRECIATION_RUN_BATCH_SIZE,
+                                  DEPRECIATION_WORK_UNIT_LEASE, DEPRECIATION_WORK_UNIT_MAX_ATTEMPTS)
+from .engine import BatchDepreciation, cap_depreciation, compile_kernels, inputs_fingerprint
+from .executor import RunExecutor
+from .models import (AssetSetting, AssetType, Asset, CalculatedDepreciation, DepreciationRun,
+                     DepreciationWorkUnit)
+from .periods import get_month_ends, month_end
+from .utils import AssetParams, calculate_depreciation, get_depreciable_amount
+from .writers import ScheduleWriter
+
+
+# asset, month ends, depreciation of each month
+Schedule = Tuple[Asset, List[date], List[float]]
+# Asset type settings copied to the assets of the type
+ASSET_TYPE_INPUTS = ('depreciation_method', 'averaging_method', 'rate', 'effective_life')
+
+
+def get_last_depreciation_dates(assets: List[Asset]) -> Dict[int, date]:
+    return dict(CalculatedDepreciation.objects.filter(asset__in=assets).order_by()
+                .values_list('asset').annotate(Max('depreciation_date')))
+
+
+class DepreciationRunner:
+    """Posts the depreciation schedules of the registered assets of a user up to to_date (excluded).
+
+    Assets are processed batch_size at a time, in pk order, each batch is committed in its own transaction.
+    Queued runs are split in DepreciationWorkUnit of batch_size assets, each unit is one run_batch.
+    """
+
+    def __init__(self, user, to_date: Union[date, str], incremental: bool = False,
+                 batch_size: Union[int, None] = None, executor: Union[RunExecutor, None] = None,
+                 start_date: Union[date, str, None] = None):
+        self.user = user
+        self.start_date: str = str(start_date or AssetSetting.objects.get(user=user).start_date)
+        self.to_date = to_date
+        # Incremental : only compute the months after the last posted period
+        self.incremental: bool = incremental
+        self.batch_size: int = batch_size or DEPRECIATION_RUN_BATCH_SIZE
+        self.executor: RunExecutor = executor or RunExecutor()
+        self.list_of_dates: List[date] = get_month_ends(self.start_date, to_date)
+
+    def get_assets(self) -> QuerySet:
+        assets: QuerySet = Asset.objects.filter(user=self.user, asset_status='RE').order_by('pk')
+        if self.list_of_dates:
+            # Fully depreciated within the run, the posted schedule is complete
+            assets = assets.exclude(fully_depreciated_at__lte=self.list_of_dates[-1])
+        return assets
+
+    def get_batches(self) -> Iterator[List[Asset]]:
+        # Streamed from a server-side cursor, batch_size assets at a time
+        assets: Iterator[Asset] = self.get_assets().iterator(chunk_size=self.batch_size)
+        batch: List[Asset] = list(islice(assets, self.batch_size))
+        while batch:
+            yield batch
+            batch = list(islice(assets, self.batch_size))
+
+    def calculate_batch(self, assets: List[Asset]) -> Tuple[List[Asset], List[Schedule]]:
+        # Assets whose posted schedule is replaced, and the months to post for each asset
+        list_of_dates: List[date] = self.list_of_dates
+        last_dates: Dict[int, date] = get_last_depreciation_dates(assets) if self.incremental else {}
+        # Index of the first month to compute for each asset
+        offsets: Dict[int, int] = {}
+        recompute: List[Asset] = []
+        for asset in assets:
+            fingerprint: str = inputs_fingerprint(asset, self.start_date)
+            last_date: Union[date, None] = last_dates.get(asset.pk)
+            if last_date and asset.depreciation_fingerprint == fingerprint:
+                # History is up-to-date, append the missing months
+                offsets[asset.pk] = bisect_right(list_of_dates, last_date)
+            else:
+                # Inputs changed (or full run), recompute from the start date
+                offsets[asset.pk] = 0
+                recompute.append(asset)
+            asset.depreciation_fingerprint = fingerprint
+        assets = [asset for asset in assets if offsets[asset.pk] < len(list_of_dates)]
+        if not assets:
+            return recompute, []
+        first_offset: int = min(offsets.values())
+        periods: List[date] = list_of_dates[first_offset:]
+        # assets x months depreciation matrix
+        depreciations: np.ndarray = self.executor.calculate_depreciation(compile_kernels(assets), periods)
+        # Months before the first month of an asset are not posted
+        starts: np.ndarray = np.array([offsets[asset.pk] - first_offset for asset in assets], dtype=np.int64)
+        depreciations = np.where(np.arange(len(periods)) < starts[:, None], 0.0, depreciations)
+        # Depreciation left before the residual value, appended months continue the posted total
+        recomputed: Set[int] = {asset.pk for asset in recompute}
+        remaining: np.ndarray = np.array([
+            get_depreciable_amount(asset.purchase_price, asset.residual_value) -
+            (0.0 if asset.pk in recomputed else asset.accumulated_depreciation) for asset in assets])
+        depreciations, last_periods = cap_depreciation(depreciations, remaining)
+        schedules: List[Schedule] = []
+        for asset, asset_depreciations, start, last_period in zip(assets, depreciations.tolist(), starts.tolist(),
+                                                                  last_periods.tolist()):
+            # Nothing is posted after the fully depreciated month
+            end: int = len(periods) if last_period < 0 else last_period + 1
+            schedules.append((asset, periods[start:end], asset_depreciations[start:end]))
+        return recompute, schedules
+
+    def run_batch(self, assets: List[Asset]) -> int:
+        recompute, schedules = self.calculate_batch(assets)
+        writer: ScheduleWriter = ScheduleWriter(self.user)
+        # Delete old calculations
+        writer.delete(recompute)
+        for asset, dates, depreciations in schedules:
+            writer.add(asset, dates, depreciations)
+        return writer.save(update_fields=('book_value', 'depreciation_fingerprint'))
+
+    def run(self) -> int:
+        # Returns the number of rows written
+        written: int = 0
+        for batch in self.get_batches():
+            with transaction.atomic():
+                written += self.run_batch(batch)
+        return written
+
+    def dry_run(self) -> 'RunDiff':
+        # Same schedules as run(), compared with the posted ones, nothing is written
+        diff: RunDiff = RunDiff()
+        for batch in self.get_batches():
+            diff.add(*self.calculate_batch(batch))
+        return diff.load_asset_types()
+
+
+class RunDiff:
+    """What a run would change : rows added, changed and removed and book values, per asset and per asset type.
+
+    Unchanged assets are only counted in the totals.
+    """
+
+    def __init__(self):
+        self.assets: List[dict] = []
+        self.asset_types: Dict[int, dict] = {}
+        self.totals: Dict[str, Union[int, float]] = dict.fromkeys(
+            ('assets', 'assets_changed', 'rows_added', 'rows_changed', 'rows_removed', 'depreciation_before',
+             'depreciation_after', 'book_value_before', 'book_value_after'), 0)
+
+    @staticmethod
+    def get_posted(assets: List[Asset]) -> Dict[int, Dict[date, float]]:
+        posted: Dict[int, Dict[date, float]] = {asset.pk: {} for asset in assets}
+        for asset_pk, depreciation_date, depreciation_of in (
+                CalculatedDepreciation.objects.filter(asset__in=assets).order_by()
+                .values_list('asset', 'depreciation_date', 'depreciation_of')):
+            posted[asset_pk][depreciation_date] = depreciation_of or 0.0
+        return posted
+
+    def get_asset_type(self, asset_type_pk: int) -> dict:
+        if asset_type_pk not in self.asset_types:
+            self.asset_types[asset_type_pk] = {'asset_type_pk': asset_type_pk, 'assets': 0, **dict.fromkeys(
+                ('depreciation_before', 'depreciation_after', 'book_value_before', 'book_value_after'), 0.0)}
+        return self.asset_types[asset_type_pk]
+
+    def add(self, recompute: List[Asset], schedules: List[Schedule]) -> 'RunDiff':
+        computed: Dict[int, Schedule] = {schedule[0].pk: schedule for schedule in schedules}
+        replaced: Set[int] = {asset.pk for asset in recompute}
+        assets: List[Asset] = list({asset.pk: asset for asset in recompute + [schedule[0] for schedule in schedules]}
+                                   .values())
+        posted: Dict[int, Dict[date, float]] = self.get_posted(assets)
+        for asset in assets:
+            before: Dict[date, float] = posted[asset.pk]
+            # Replaced schedules are deleted first, the others get the missing months appended
+            after: Dict[date, float] = {} if asset.pk in replaced else dict(before)
+            if asset.pk in computed:
+                _, dates, depreciations = computed[asset.pk]
+                after.update(zip(dates, depreciations))
+            added: int = len(after.keys() - before.keys())
+            removed: int = len(before.keys() - after.keys())
+            changed: int = sum(1 for date_ in after.keys() & before.keys() if after[date_] != before[date_])
+            book_value_before: float = asset.book_value or 0.0
+            # As ScheduleWriter.save, book values are only set for the assets getting rows
+            book_value_after: float = (int(asset.purchase_price) - sum(after.values()) if asset.pk in computed
+                                       else book_value_before)
+            row: dict = {
+                'rows_added': added,
+                'rows_changed': changed,
+                'rows_removed': removed,
+                'depreciation_before': float(sum(before.values())),
+                'depreciation_after': float(sum(after.values())),
+                'book_value_before': book_value_before,
+                'book_value_after': book_value_after,
+            }
+            asset_type: dict = self.get_asset_type(asset.asset_type_id)
+            asset_type['assets'] += 1
+            self.totals['assets'] += 1
+            for key, value in row.items():
+                self.totals[key] += value
+                if key in asset_type:
+                    asset_type[key] += value
+            if added or changed or removed or book_value_after != book_value_before:
+                self.totals['assets_changed'] += 1
+                self.assets.append({'asset_pk': asset.pk, 'asset_number': asset.asset_number, **row})
+        return self
+
+    def merge(self, diff: 'RunDiff') -> 'RunDiff':
+        self.assets.extend(diff.assets)
+        for key, value in diff.totals.items():
+            self.totals[key] += value
+        for asset_type_pk, values in diff.asset_types.items():
+            asset_type: dict = self.get_asset_type(asset_type_pk)
+            for key, value in values.items():
+                if key != 'asset_type_pk':
+                    asset_type[key] += value
+        return self
+
+    def load_asset_types(self) -> 'RunDiff':
+        # Names and accounts of the asset types, one query
+        for asset_type in AssetType.objects.filter(pk__in=list(self.asset_types)).select_related(
+                'asset_account', 'accumulated_depreciation_account', 'depreciation_expense_account'):
+            self.asset_types[asset_type.pk].update({
+                'asset_type': asset_type.asset_type,
+                'asset_account': asset_type.asset_account.account_type_code,
+                'accumulated_depreciation_account': asset_type.accumulated_depreciation_account.account_type_code,
+                'depreciation_expense_account': asset_type.depreciation_expense_account.account_type_code,
+            })
+        return self
+
+    def to_dict(self) -> dict:
+        def rounded(values: dict) -> dict:
+            return {key: round(value, 2) if isinstance(value, float) else value for key, value in values.items()}
+
+        return {
+            'totals': rounded(self.totals),
+            'asset_types': [rounded(asset_type) for asset_type in self.asset_types.values()],
+            'assets': [rounded(asset) for asset in self.assets],
+        }
+
+
+def get_last_run_date(user, exclude: Union[List[Asset], None] = None) -> Union[date, None]:
+    # Last period posted for the registered assets of the user
+    assets: QuerySet = Asset.objects.filter(user=user, asset_status='RE')
+    if exclude:
+        assets = assets.exclude(pk__in=[asset.pk for asset in exclude])
+    return assets.aggregate(last=Max('depreciated_to'))['last']
+
+
+def calculate_catch_up_schedules(assets: List[Asset], to_date: Union[date, None]) -> List[Schedule]:
+    # Schedules from the start month of each asset up to to_date (at least the start month), one depreciation matrix
+    assets = [asset for asset in assets if asset.depreciation_start_date]
+    if not assets:
+        return []
+    first_months: List[date] = [month_end(asset.depreciation_start_date) for asset in assets]
+    periods: List[date] = get_month_ends(min(asset.depreciation_start_date for asset in assets).replace(day=1),
+                                         max(first_months + ([to_date] if to_date else [])) + timedelta(days=1))
+    depreciations: np.ndarray = BatchDepreciation.from_assets(assets, periods).calculate_depreciation()
+    starts: np.ndarray = np.array([bisect_right(periods, first_month) - 1 for first_month in first_months],
+                                  dtype=np.int64)
+    depreciations = np.where(np.arange(len(periods)) < starts[:, None], 0.0, depreciations)
+    for index, asset in enumerate(assets):
+        # The start month is depreciated from the start date, not from the 1st
+        depreciations[index, starts[index]] = calculate_depreciation(
+            AssetParams.from_asset(asset, asset.depreciation_start_date))
+    remaining: np.ndarray = np.array([get_depreciable_amount(asset.purchase_price, asset.residual_value)
+                                      for asset in assets])
+    depreciations, last_periods = cap_depreciation(depreciations, remaining)
+    schedules: List[Schedule] = []
+    for asset, asset_depreciations, start, first_month, last_period in zip(
+            assets, depreciations.tolist(), starts.tolist(), first_months, last_periods.tolist()):
+        end: int = bisect_right(periods, max(to_date or first_month, first_month))
+        if last_period >= 0:
+            end = min(end, last_period + 1)
+        schedules.append((asset, periods[start:end], asset_depreciations[start:end]))
+    return schedules
+
+
+def post_catch_up_schedules(user, assets: List[Asset], to_date: Union[date, None] = None,
+                            update_fields: Sequence[str] = ('book_value',)) -> int:
+    # Schedules of newly registered assets, from their start month up to to_date (the last run date by default),
+    # one bulk insert, update_fields of the assets in one bulk_update. Returns the number of rows written.
+    to_date = to_date or get_last_run_date(user, exclude=assets)
+    writer: ScheduleWriter = ScheduleWriter(user)
+    # Delete old calculations
+    writer.delete(assets)
+    for asset, dates, depreciations in calculate_catch_up_schedules(assets, to_date):
+        # Kept when nothing is left to depreciate
+        asset.book_value = int(asset.purchase_price)
+        writer.add(asset, dates, depreciations)
+    return writer.save(update_fields=update_fields)
+
+
+def post_schedule_changes(user, asset: Asset) -> Union[date, None]:
+    # Replaces the posted schedule of an edited asset from the first month that differs, the months before are kept.
+    # Posted up to the last run date, or the last posted month if later.
+    # Returns that first month, None when the posted schedule is unchanged.
+    posted: List[Tuple[date, float]] = list(CalculatedDepreciation.objects.filter(asset=asset)
+                                            .order_by('depreciation_date')
+                                            .values_list('depreciation_date', 'depreciation_of'))
+    to_dates: List[date] = [row[0] for row in posted[-1:]] + [get_last_run_date(user, exclude=[asset])]
+    to_date: Union[date, None] = max(filter(None, to_dates), default=None)
+    schedules: List[Schedule] = calculate_catch_up_schedules([asset], to_date)
+    dates, depreciations = (schedules[0][1], schedules[0][2]) if schedules else ([], [])
+    changed: int = next((index for index, (row, new_row) in enumerate(zip(posted, zip(dates, depreciations)))
+                         if row != new_row), min(len(posted), len(dates)))
+    if changed == len(posted) == len(dates):
+        return None
+    first_date: date = min([row[0] for row in posted[changed:changed + 1]] + dates[changed:changed + 1])
+    CalculatedDepreciation.objects.filter(asset=asset, depreciation_date__gte=first_date).delete()
+    writer: ScheduleWriter = ScheduleWriter(user)
+    # Book value of the kept rows when nothing is added after them
+    asset.book_value = int(asset.purchase_price) - sum(depreciation for _, depreciation in posted[:changed])
+    asset.depreciation_fingerprint = None
+    writer.add(asset, dates[changed:], depreciations[changed:])
+    writer.save(update_fields=('book_value', 'depreciation_fingerprint'))
+    return first_date
+
+
+def apply_asset_type(asset_type: AssetType,
+                     previous: Dict[str, Any]) -> Tuple[Dict[str, Union[int, None]], List[int]]:
+    # Copies the changed settings of asset_type to its assets still using the previous values, in one UPDATE.
+    # Returns the counts and the registered assets among them, to give to recompute_assets once committed.
+    result: Dict[str, Union[int, None]] = dict(assets_updated=0, assets_recomputed=0, rows_written=0, run=None)
+    changes: Dict[str, Any] = {field: getattr(asset_type, field) for field in ASSET_TYPE_INPUTS
+                               if getattr(asset_type, field) != previous[field]}
+    if not changes:
+        return result, []
+    asset_pks: List[int] = list(Asset.objects.filter(asset_type=asset_type, **{
+        field: previous[field] for field in changes}).values_list('pk', flat=True))
+    registered: List[int] = list(Asset.objects.filter(pk__in=asset_pks, asset_status='RE').order_by('pk')
+                                 .values_list('pk', flat=True))
+    result['assets_updated'] = Asset.objects.filter(pk__in=asset_pks).update(
+        **changes, depreciation_fingerprint=None, fully_depreciated_at=None)
+    return result, registered
+
+
+def recompute_assets(user, asset_pks: List[int],
+                     synchronous_limit: Union[int, None] = None) -> Dict[str, Union[int, None]]:
+    # Schedules of the assets recomputed up to the last run date, batch_size assets per transaction, or by a queued
+    # incremental run when there are more than synchronous_limit assets.
+    result: Dict[str, Union[int, None]] = dict(assets_recomputed=0, rows_written=0, run=None)
+    last_run_date: Union[date, None] = get_last_run_date(user)
+    asset_setting: Union[AssetSetting, None] = AssetSetting.objects.filter(user=user).exclude(start_date=None).first()
+    if not asset_pks or last_run_date is None or asset_setting is None:
+        return result
+    to_date: date = last_run_date + timedelta(days=1)
+    if len(asset_pks) > (synchronous_limit or DEPRECIATION_APPLY_SYNC_LIMIT):
+        # Assets without a fingerprint are recomputed by the run, the others only caught up
+        result['run'] = queue_run(user, to_date, incremental=True).pk
+        return result
+    runner: DepreciationRunner = DepreciationRunner(user, to_date, start_date=asset_setting.start_date)
+    for start in range(0, len(asset_pks), runner.batch_size):
+        batch: List[Asset] = list(Asset.objects.filter(pk__in=asset_pks[start:start + runner.batch_size])
+                                  .order_by('pk'))
+        with transaction.atomic():
+            result['rows_written'] += runner.run_batch(batch)
+    result['assets_recomputed'] = len(asset_pks)
+    return result
+
+
+def queue_run(user, to_date: date, incremental: bool = False) -> DepreciationRun:
+    # The queued or running run of the same user, to_date and mode, else a new queued run.
+    # A concurrent request creating the same run fails on depreciation_run_active_uniq and gets that run.
+    runs: QuerySet = DepreciationRun.objects.filter(user=user, to_date=to_date, incremental=incremental,
+                                                    status__in=('QU', 'RU'))
+    run: Union[DepreciationRun, None] = runs.first()
+    if run is not None:
+        return run
+    try:
+        with transaction.atomic():
+            return DepreciationRun.objects.create(user=user, to_date=to_date, incremental=incremental)
+    except IntegrityError as e:
+        # Any other integrity error (a user deleted meanwhile...) is raised
+        constraint_name: Union[str, None] = getattr(getattr(e.__cause__, 'diag', None), 'constraint_name', None)
+        run = runs.first() if constraint_name == 'depreciation_run_active_uniq' else None
+        if run is None:
+            raise
+        return run
+
+
+def get_worker_name() -> str:
+    return '{}:{}'.format(socket.gethostname(), getpid())
+
+
+def plan_run(worker: str, run: Union[DepreciationRun, None] = None) -> Union[DepreciationRun, None]:
+    # Splits the oldest queued run (or run) in work units of batch_size assets, runs planned by another worker
+    # are skipped
+    with transaction.atomic():
+        runs: QuerySet = DepreciationRun.objects.select_for_update(skip_locked=True).filter(status='QU')
+        if run is not None:
+            runs = runs.filter(pk=run.pk)
+        run = runs.order_by('pk').first()
+        if run is None:
+            return None
+        run.status = 'RU'
+        run.worker = worker
+        run.started_at = timezone.now()
+        try:
+            runner: DepreciationRunner = DepreciationRunner(run.user, run.to_date, incremental=run.incremental,
+                                                            start_date=run.start_date)
+        except AssetSetting.DoesNotExist:
+            run.status, run.finished_at = 'FA', timezone.now()
+            run.errors = run.errors + [{'error': 'Asset setting for this user do not exist.'}]
+            run.save(update_fields=['status', 'worker', 'started_at', 'finished_at', 'errors'])
+            return run
+        run.start_date = runner.start_date
+        # A resumed run keeps its units, only the failed and cancelled ones are queued again
+        if not run.work_unit_run.exists():
+            asset_pks: List[int] = list(runner.get_assets().values_list('pk', flat=True))
+            DepreciationWorkUnit.objects.bulk_create(
+                DepreciationWorkUnit(run=run, first_asset_pk=asset_pks[start],
+                                     last_asset_pk=asset_pks[start:start + runner.batch_size][-1])
+                for start in range(0, len(asset_pks), runner.batch_size))
+            run.assets_total = len(asset_pks)
+            if not asset_pks:
+                run.status, run.finished_at = 'DO', run.started_at
+        run.save(update_fields=['status', 'worker', 'started_at', 'finished_at', 'start_date', 'assets_total'])
+    return run
+
+
+def claim_unit(worker: str, run: Union[DepreciationRun, None] = None) -> Union[DepreciationWorkUnit, None]:
+    # Oldest queued unit, or a running one whose worker stopped renewing its lease
+    now = timezone.now()
+    with transaction.atomic():
+        units: QuerySet = (DepreciationWorkUnit.objects.select_for_update(skip_locked=True, of=('self',))
+                           .select_related('run__user')
+                           .filter(Q(status='QU') | Q(status='RU', lease_expires_at__lt=now), run__status='RU'))
+        if run is not None:
+            units = units.filter(run=run)
+        unit: Union[DepreciationWorkUnit, None] = units.order_by('pk').first()
+        if unit is None:
+            return None
+        unit.status = 'RU'
+        unit.worker = worker
+        unit.attempts += 1
+        unit.heartbeat_at = now
+        unit.lease_expires_at = now + timedelta(seconds=DEPRECIATION_WORK_UNIT_LEASE)
+        unit.save(update_fields=['status', 'worker', 'attempts', 'heartbeat_at', 'lease_expires_at'])
+    return unit
+
+
+class Heartbeat:
+    """Renews the lease of a claimed unit from a background thread while the unit is computed."""
+
+    def __init__(self, unit: DepreciationWorkUnit, interval: Union[float, None] = None):
+        self.unit: DepreciationWorkUnit = unit
+        self.interval: float = interval or DEPRECIATION_WORK_UNIT_LEASE / 3
+        self.stopped: Event = Event()
+        self.thread: Thread = Thread(target=self.beat, daemon=True)
+
+    def beat(self) -> None:
+        try:
+            while not self.stopped.wait(self.interval):
+                now = timezone.now()
+                self.unit.get_lease().update(heartbeat_at=now,
+                                             lease_expires_at=now + timedelta(seconds=DEPRECIATION_WORK_UNIT_LEASE))
+        finally:
+            # Each thread has its own database connection
+            connection.close()
+
+    def __enter__(self) -> 'Heartbeat':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def finish_run(run: DepreciationRun) -> None:
+    # The worker of the last unit of a run sets its final status
+    with transaction.atomic():
+        run = DepreciationRun.objects.select_for_update().get(pk=run.pk)
+        units: QuerySet = run.work_unit_run.all()
+        if run.status != 'RU' or units.filter(status__in=('QU', 'RU')).exists():
+            return
+        failed: List[DepreciationWorkUnit] = list(units.filter(status__in=('FA', 'CA')).order_by('pk'))
+        run.status = 'FA' if failed else 'DO'
+        run.errors = [{'assets': '{}-{}'.format(unit.first_asset_pk, unit.last_asset_pk), 'error': unit.error}
+                      for unit in failed]
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'errors', 'finished_at'])
+
+
+def process_unit(unit: DepreciationWorkUnit) -> DepreciationWorkUnit:
+    # Computes and commits the schedules of the unit assets and the run progress in one transaction
+    run: DepreciationRun = unit.run
+    try:
+        with Heartbeat(unit):
+            runner: DepreciationRunner = DepreciationRunner(run.user, run.to_date, incremental=run.incremental,
+                                                            start_date=run.start_date)
+            with transaction.atomic():
+                assets: List[Asset] = list(runner.get_assets().filter(pk__gte=unit.first_asset_pk,
+                                                                      pk__lte=unit.last_asset_pk))
+                rows: int = runner.run_batch(assets)
+                finished_at = timezone.now()
+                # Nothing is committed if the lease expired and another worker claimed the unit
+                if not unit.get_lease().update(
+                        status='DO', assets_processed=len(assets), rows_written=rows, finished_at=finished_at):
+                    raise LeaseLost('Unit {} was claimed by another worker'.format(unit.pk))
+                DepreciationRun.objects.filter(pk=run.pk).update(
+                    assets_processed=F('assets_processed') + len(assets), rows_written=F('rows_written') + rows)
+        unit.status, unit.assets_processed, unit.rows_written, unit.finished_at = 'DO', len(assets), rows, finished_at
+    except LeaseLost:
+        return unit
+    except Exception as e:
+        # Queued again until the unit has been tried DEPRECIATION_WORK_UNIT_MAX_ATTEMPTS times
+        unit.status = 'FA' if unit.attempts >= DEPRECIATION_WORK_UNIT_MAX_ATTEMPTS else 'QU'
+        unit.error = '{}: {}\n{}'.format(type(e).__name__, e, traceback.format_exc())
+        unit.get_lease().update(status=unit.status, error=unit.error)
+    finish_run(run)
+    return unit
+
+
+def resume_run(run: DepreciationRun) -> DepreciationRun:
+    # Queues the failed and cancelled units again, the units already done are kept
+    with transaction.atomic():
+        run.work_unit_run.filter(status__in=('FA', 'CA')).update(status='QU', attempts=0, error=None)
+        planned: bool = run.work_unit_run.exists()
+        run.status = 'RU' if planned else 'QU'
+        run.errors = []
+        run.finished_at = None
+        run.save(update_fields=['status', 'errors', 'finished_at'])
+    return run
+
+
+def cancel_run(run: DepreciationRun) -> DepreciationRun:
+    # Queued units are not started, running ones are committed
+    with transaction.atomic():
+        run.work_unit_run.filter(status='QU').update(status='CA')
+        run.status = 'CA'
+        if run.finished_at is None:
+            run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'finished_at'])
+    return run
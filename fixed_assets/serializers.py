@@ -1,12 +1,8 @@
-from typing import Union
-
-from django.db.models import Sum, QuerySet
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 
 from .models import (AssetSetting, AssetType, Asset, AssetAccount,
-                     CalculatedDepreciation, DisposedAsset)
-from datetime import datetime, date
+                     CalculatedDepreciation, DisposedAsset, DepreciationRun)
 
 
 class AssetSettingSerializer(serializers.ModelSerializer):
@@ -110,34 +106,21 @@ class AssetsGetSerializer(serializers.ModelSerializer):
     cost_basis = SerializerMethodField()
     basis_value = SerializerMethodField()
     accumulated_depreciation = SerializerMethodField()
-    ytd_depreciation = SerializerMethodField()
+    # Annotated by utils.annotate_ytd_depreciation
+    ytd_depreciation = serializers.FloatField(read_only=True)
     depreciated_to = SerializerMethodField()
 
-    @staticmethod
-    def get_ytd_depreciation(obj):
-        starting_day_of_current_year: date = datetime.now().date().replace(month=1, day=1)
-        result: QuerySet[CalculatedDepreciation] = (CalculatedDepreciation.objects.filter(asset=obj.pk)
-                                                    .filter(depreciation_date__gte=starting_day_of_current_year,
-                                                            depreciation_date__lte=datetime.now().date()))
-        total: Union[float, int] = 0
-        i: Union[QuerySet, CalculatedDepreciation]
-        for i in result:
-            total += i.depreciation_of
-        return total
-
     @staticmethod
     def get_depreciated_to(obj):
-        return CalculatedDepreciation.objects.filter(asset=obj.pk).latest('depreciation_date').depreciation_date
+        return obj.depreciated_to
 
     @staticmethod
     def get_accumulated_depreciation(obj):
-        return ((CalculatedDepreciation.objects.filter(asset=obj.pk).aggregate(Sum('depreciation_of')))
-                .get('depreciation_of__sum'))
+        return obj.accumulated_depreciation if obj.depreciation_rows else None
 
     @staticmethod
     def get_basis_value(obj):
-        return (int(obj.purchase_price) - (CalculatedDepreciation.objects.filter(asset=obj.pk)
-                                           .aggregate(Sum('depreciation_of'))).get('depreciation_of__sum'))
+        return int(obj.purchase_price) - obj.accumulated_depreciation
 
     @staticmethod
     def get_cost_basis(obj):
@@ -161,6 +144,8 @@ class AssetsGetSerializer(serializers.ModelSerializer):
 
 
 class AssetsListSerializer(serializers.ModelSerializer):
+    # Annotated by utils.annotate_ytd_depreciation
+    ytd_depreciation = serializers.FloatField(read_only=True)
     # book_value = serializers.SerializerMethodField()
     #
     # @staticmethod
@@ -182,7 +167,8 @@ class AssetsListSerializer(serializers.ModelSerializer):
                   'depreciation_start_date', 'cost_limit',
                   'residual_value', 'depreciation_method',
                   'averaging_method', 'rate', 'effective_life',
-                  'asset_status', 'book_value']
+                  'asset_status', 'book_value', 'accumulated_depreciation',
+                  'ytd_depreciation', 'depreciated_to', 'depreciation_rows']
         extra_kwargs = {
             'pk': {'read_only': True},
             'user': {'write_only': True},
@@ -197,7 +183,7 @@ class AssetsListSerializer(serializers.ModelSerializer):
 class CalculatedDepreciationSerializer(serializers.ModelSerializer):
     class Meta:
         model = CalculatedDepreciation
-        fields = ['pk', 'asset', 'depreciation_of', 'depreciation_date']
+        fields = ['pk', 'asset', 'depreciation_of', 'depreciation_date', 'accumulated_depreciation']
         extra_kwargs = {
             'pk': {'read_only': True},
         }
@@ -248,4 +234,15 @@ class AssetsDisposedListSerializer(serializers.ModelSerializer):
                   'gain_losses']
         extra_kwargs = {
             'pk': {'read_only': True},
-        }
\ No newline at end of file
+        }
+
+
+class DepreciationRunSerializer(serializers.ModelSerializer):
+    percent_done = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DepreciationRun
+        fields = ['pk', 'to_date', 'incremental', 'status', 'percent_done',
+                  'assets_total', 'assets_processed', 'rows_written', 'errors',
+                  'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
@@ -1,7 +1,43 @@
 from typing import Union
 import pytest
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 import calendar
+from types import SimpleNamespace
+
+import numpy as np
+from django.utils import timezone
+
+from auth.models import CustomUser
+from xero_assets.settings import DEPRECIATION_WORK_UNIT_MAX_ATTEMPTS
+from fixed_assets.engine import BatchDepreciation, round_2, inputs_fingerprint, cap_depreciation
+from fixed_assets.executor import RunExecutor
+from fixed_assets.management.commands.run_depreciation import Command, Tenant
+from fixed_assets.models import (Asset, AssetAccount, AssetSetting, AssetType, CalculatedDepreciation, DepreciationRun,
+                                 DepreciationWorkUnit, DisposedAsset)
+from fixed_assets.periods import get_month_ends
+from fixed_assets.runs import (DepreciationRunner, RunDiff, cancel_run, claim_unit, plan_run, post_catch_up_schedules,
+                               post_schedule_changes, process_unit, resume_run)
+from fixed_assets.utils import (AssetParams, StraightLine, DecliningBalanceBy100Or150Or200,
+                                Kernel, calculate_depreciation, compile_kernel, calculate_capped_depreciation,
+                                get_depreciable_amount, cap_period_depreciation, annotate_ytd_depreciation)
+from fixed_assets.views import AssetsRegisterView
+
+
+@pytest.fixture
+def portfolio(db) -> CustomUser:
+    # User with a start date, an asset type and 5 registered assets
+    user: CustomUser = CustomUser.objects.create_user('portfolio@example.com', 'portfolio')
+    account: AssetAccount = AssetAccount.objects.create(account_type_code='PORTFOLIO')
+    AssetSetting.objects.create(user=user, start_date=date(2023, 1, 1))
+    asset_type: AssetType = AssetType.objects.create(
+        user=user, asset_type='Equipment', asset_account=account, accumulated_depreciation_account=account,
+        depreciation_expense_account=account, depreciation_method='ST', averaging_method='FM', rate=20)
+    Asset.objects.bulk_create(
+        Asset(user=user, asset_name='asset {}'.format(index), asset_number='portfolio-{}'.format(index),
+              purchase_date=date(2023, 1, 1), purchase_price=6000, asset_type=asset_type,
+              depreciation_start_date=date(2023, 1, 1), depreciation_method='ST', averaging_method='FM', rate=20,
+              asset_status='RE', book_value=6000) for index in range(5))
+    return user
 
 
 class Init:
@@ -108,3 +144,453 @@ class TestStaightLineActualDaysRate(Init):
         result: Union[int, float] = ((((cost_limit - residual_value) / effective_year) / self.days_in_year()) *
                                      delta.days)
         assert round(result, 2) == 47.01
+
+
+# ! Batch engine must match the per-month calculators cell by cell
+class TestBatchDepreciation:
+    period_dates = [date(2023, 11, 30), date(2023, 12, 31), date(2024, 1, 31), date(2024, 2, 29)]
+    assets = {
+        'purchase_price': [6000, 6000, 6000, 6000, 6000, 6000, 1234.56],
+        'cost_limit': [None, 3000, None, 4500, None, 4500, None],
+        'residual_value': [None, None, 1500, 600, None, 600, 100],
+        'rate': [20.00, 20.00, None, None, 20.00, None, None],
+        'effective_life': [None, None, 5, 5, None, 5, 3],
+        'depreciation_method': ['ST', 'ST', 'ST', 'ST', 'ST', '150', '200'],
+        'averaging_method': ['FM', 'FM', 'AD', 'AD', 'AD', 'FM', 'AD'],
+    }
+
+    def calculate(self, index: int, date_: date) -> float:
+        data = {key: values[index] for key, values in self.assets.items()}
+        data['depreciation_start_date'] = '{}-{}-1'.format(date_.year, date_.month)
+        if data['depreciation_method'] == 'ST':
+            return StraightLine(data).calculate_depreciation()
+        return DecliningBalanceBy100Or150Or200(data).calculate_depreciation()
+
+    def test_matches_calculators(self):
+        result = BatchDepreciation.from_columns(self.assets, self.period_dates).calculate_depreciation()
+        assert result.shape == (7, 4)
+        for index in range(7):
+            for column, date_ in enumerate(self.period_dates):
+                assert result[index, column] == self.calculate(index, date_)
+
+    def test_full_month_rate(self):
+        result = BatchDepreciation.from_columns(self.assets, self.period_dates).calculate_depreciation()
+        # depreciation of 100 each month, 50 with a 3000 cost limit
+        assert list(result[0]) == [100, 100, 100, 100]
+        assert list(result[1]) == [50, 50, 50, 50]
+
+    def test_no_and_full_depreciation(self):
+        assets = {key: values[:2] for key, values in self.assets.items()}
+        assets['depreciation_method'] = ['ND', 'FD']
+        result = BatchDepreciation.from_columns(assets, self.period_dates).calculate_depreciation()
+        assert not result.any()
+
+    def test_round_2_matches_builtin_round(self):
+        values = [2.675, 0.125, 1.005, 72.3333, 1000000000.005, 54.245]
+        assert list(round_2(np.array(values))) == [round(value, 2) for value in values]
+
+
+class TestInputsFingerprint:
+    asset = SimpleNamespace(purchase_price=6000, cost_limit=None, residual_value=600, rate=20.0,
+                            effective_life=None, depreciation_method='ST', averaging_method='FM')
+
+    def test_blank_and_zero_are_the_same_input(self):
+        asset = SimpleNamespace(**{**vars(self.asset), 'cost_limit': 0, 'purchase_price': 6000.0})
+        assert inputs_fingerprint(asset, '2023-01-01') == inputs_fingerprint(self.asset, date(2023, 1, 1))
+
+    def test_changes_with_inputs_and_start_date(self):
+        fingerprint = inputs_fingerprint(self.asset, '2023-01-01')
+        assert inputs_fingerprint(self.asset, '2022-01-01') != fingerprint
+        asset = SimpleNamespace(**{**vars(self.asset), 'averaging_method': 'AD'})
+        assert inputs_fingerprint(asset, '2023-01-01') != fingerprint
+
+
+class TestMonthEnds:
+    def test_month_ends_between_dates(self):
+        assert get_month_ends('2023-11-08', '2024-03-01') == [date(2023, 11, 30), date(2023, 12, 31),
+                                                              date(2024, 1, 31), date(2024, 2, 29)]
+
+    def test_end_date_is_excluded(self):
+        assert get_month_ends('2024-01-01', '2024-02-01') == [date(2024, 1, 31)]
+        assert get_month_ends('2024-01-31', '2024-01-31') == []
+        assert get_month_ends(date(2024, 1, 31), '2024-01-30') == []
+
+
+class TestAssetParams:
+    def test_parses_start_date_and_normalizes_blanks(self):
+        params = AssetParams.from_kwargs({'depreciation_start_date': '2024-2-8 00:00:00', 'purchase_price': 6000,
+                                          'cost_limit': None, 'averaging_method': 'AD', 'rate': 20})
+        assert params.start_date == date(2024, 2, 8)
+        assert (params.cost_limit, params.residual_value, params.effective_life) == (0.0, 0.0, 0.0)
+        assert (params.days_in_year, params.days_in_month) == (366, 21)
+
+    def test_same_depreciation_as_kwargs(self):
+        data = {'depreciation_start_date': '2023-11-8', 'purchase_price': 6000.0, 'residual_value': 600.0,
+                'averaging_method': 'AD', 'effective_life': 5.0, 'depreciation_method': '150'}
+        params = AssetParams.from_kwargs(data)
+        assert StraightLine(params).calculate_depreciation() == StraightLine(data).calculate_depreciation()
+        assert (DecliningBalanceBy100Or150Or200(params).calculate_depreciation() ==
+                DecliningBalanceBy100Or150Or200(data).calculate_depreciation())
+
+
+class TestKernels:
+    def test_matches_calculators(self):
+        for method in ('ST', '100', '150', '200', 'FD'):
+            for averaging_method in ('FM', 'AD'):
+                for cost_limit, residual_value in ((None, None), (3000, None), (None, 600), (4500, 600)):
+                    for rate, effective_life in ((20.0, None), (None, 5), (20.0, 5)):
+                        data = {'depreciation_start_date': '2024-2-8', 'purchase_price': 6000.0,
+                                'cost_limit': cost_limit, 'residual_value': residual_value,
+                                'averaging_method': averaging_method, 'rate': rate,
+                                'effective_life': effective_life, 'depreciation_method': method}
+                        if method == 'ST':
+                            expected = StraightLine(data).calculate_depreciation()
+                        elif method == 'FD':
+                            expected = 0.0
+                        elif effective_life:
+                            expected = DecliningBalanceBy100Or150Or200(data).calculate_depreciation()
+                        else:
+                            expected = 0.0
+                        assert calculate_depreciation(AssetParams.from_kwargs(data)) == expected, data
+
+    def test_no_depreciation(self):
+        params = AssetParams.from_kwargs({'depreciation_start_date': '2024-02-08', 'purchase_price': 6000.0,
+                                          'rate': 20.0, 'averaging_method': 'FM', 'depreciation_method': 'ND'})
+        assert compile_kernel(params) is None
+        assert calculate_depreciation(params) == 0
+
+
+class TestRunExecutor:
+    kernels = [Kernel('constant', 100.0, 1.0), Kernel('per_day', 2400.0, 1.5), None,
+               Kernel('prorated', 1200.0, 2.0), Kernel('per_day', 123.456, 1.0)]
+    period_dates = [date(2023, 11, 30), date(2023, 12, 31), date(2024, 1, 31), date(2024, 2, 29)]
+
+    def test_small_portfolio_runs_in_process(self):
+        executor = RunExecutor(workers=4, chunk_size=2, parallel_threshold=100)
+        assert not executor.is_parallel(len(self.kernels))
+        result = executor.calculate_depreciation(self.kernels, self.period_dates)
+        assert np.array_equal(result, BatchDepreciation(self.kernels, self.period_dates).calculate_depreciation())
+
+    def test_parallel_matches_in_process(self):
+        executor = RunExecutor(workers=2, chunk_size=2, parallel_threshold=0)
+        assert executor.is_parallel(len(self.kernels))
+        result = executor.calculate_depreciation(self.kernels, self.period_dates)
+        assert np.array_equal(result, BatchDepreciation(self.kernels, self.period_dates).calculate_depreciation())
+
+
+class TestDepreciationRun:
+    def test_percent_done(self):
+        assert DepreciationRun(status='QU').percent_done == 0.0
+        assert DepreciationRun(status='RU', assets_total=3, assets_processed=1).percent_done == 33.33
+        assert DepreciationRun(status='DO', assets_total=0).percent_done == 100.0
+
+
+class TestCapDepreciation:
+    def test_running_total_is_capped(self):
+        depreciations = np.array([[100.0, 100.0, 100.0, 100.0], [100.0, 100.0, 100.0, 100.0], [0.0, 0.0, 0.0, 0.0]])
+        capped, last_periods = cap_depreciation(depreciations, np.array([250.0, 1000.0, 0.0]))
+        assert capped.tolist() == [[100.0, 100.0, 50.0, 0.0], [100.0, 100.0, 100.0, 100.0], [0.0, 0.0, 0.0, 0.0]]
+        assert last_periods.tolist() == [2, -1, 0]
+
+    def test_first_period(self):
+        # Cost limit without residual value is multiplied by the effective life
+        params = AssetParams.create('2023-01-01', purchase_price=1000.0, cost_limit=3000.0, residual_value=0.0,
+                                    averaging_method='FM', rate=20.0, effective_life=5.0, depreciation_method='150')
+        assert calculate_depreciation(params) == 1875.0
+        assert calculate_capped_depreciation(params) == 1000.0
+        assert get_depreciable_amount(1234.5, 600.0) == 634.0
+        assert cap_period_depreciation(100.0, 634.0) == 100.0
+        assert cap_period_depreciation(100.0, -5.0) == 0
+
+
+class TestWorkUnits:
+    @pytest.fixture
+    def run(self, portfolio, monkeypatch) -> DepreciationRun:
+        # 3 units of 2, 2 and 1 assets
+        monkeypatch.setattr('fixed_assets.runs.DEPRECIATION_RUN_BATCH_SIZE', 2)
+        return plan_run('planner', run=DepreciationRun.objects.create(user=portfolio, to_date=date(2024, 1, 1)))
+
+    @staticmethod
+    def process_all(run: DepreciationRun, worker: str = 'worker') -> None:
+        unit: Union[DepreciationWorkUnit, None] = claim_unit(worker, run=run)
+        while unit is not None:
+            process_unit(unit)
+            unit = claim_unit(worker, run=run)
+        run.refresh_from_db()
+
+    def test_plan_run(self, run):
+        assert run.status == 'RU'
+        assert run.assets_total == 5
+        assert list(run.work_unit_run.order_by('pk').values_list('status', flat=True)) == ['QU', 'QU', 'QU']
+
+    def test_expired_lease_is_claimed_again(self, run):
+        units = [claim_unit('worker-1', run=run) for _ in range(3)]
+        assert claim_unit('worker-2', run=run) is None
+        DepreciationWorkUnit.objects.filter(pk=units[1].pk).update(
+            lease_expires_at=timezone.now() - timedelta(seconds=1))
+        unit: DepreciationWorkUnit = claim_unit('worker-2', run=run)
+        assert (unit.pk, unit.worker, unit.attempts) == (units[1].pk, 'worker-2', 2)
+        assert claim_unit('worker-2', run=run) is None
+
+    def test_stale_worker_commits_nothing(self, run):
+        unit: DepreciationWorkUnit = claim_unit('worker-1', run=run)
+        DepreciationWorkUnit.objects.filter(pk=unit.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        claimed: DepreciationWorkUnit = claim_unit('worker-2', run=run)
+        # LeaseLost : the schedules of worker-1 are rolled back
+        process_unit(unit)
+        assert not CalculatedDepreciation.objects.exists()
+        assert DepreciationWorkUnit.objects.filter(pk=unit.pk, status='RU', worker='worker-2').exists()
+        run.refresh_from_db()
+        assert (run.status, run.assets_processed) == ('RU', 0)
+        process_unit(claimed)
+        assert DepreciationWorkUnit.objects.get(pk=unit.pk).status == 'DO'
+        assert CalculatedDepreciation.objects.count() == 2 * 12
+
+    def test_done(self, run):
+        unit: DepreciationWorkUnit = claim_unit('worker', run=run)
+        process_unit(unit)
+        run.refresh_from_db()
+        # Other units are still queued
+        assert (run.status, run.assets_processed, run.rows_written) == ('RU', 2, 2 * 12)
+        self.process_all(run)
+        assert (run.status, run.assets_processed, run.rows_written, run.errors) == ('DO', 5, 5 * 12, [])
+        assert run.finished_at is not None
+
+    def test_retries_then_failed(self, run, monkeypatch):
+        failing: DepreciationWorkUnit = run.work_unit_run.order_by('pk')[1]
+        run_batch = DepreciationRunner.run_batch
+
+        def failing_run_batch(runner, assets):
+            if assets[0].pk == failing.first_asset_pk:
+                raise RuntimeError('Database is gone')
+            return run_batch(runner, assets)
+
+        monkeypatch.setattr(DepreciationRunner, 'run_batch', failing_run_batch)
+        self.process_all(run)
+        failing.refresh_from_db()
+        assert (failing.status, failing.attempts) == ('FA', DEPRECIATION_WORK_UNIT_MAX_ATTEMPTS)
+        assert failing.error.startswith('RuntimeError: Database is gone')
+        assert list(run.work_unit_run.order_by('pk').values_list('status', flat=True)) == ['DO', 'FA', 'DO']
+        assert (run.status, run.assets_processed) == ('FA', 3)
+        assert run.errors == [{'assets': '{}-{}'.format(failing.first_asset_pk, failing.last_asset_pk),
+                               'error': failing.error}]
+        # Resumed : only the failed unit is computed again
+        monkeypatch.setattr(DepreciationRunner, 'run_batch', run_batch)
+        resume_run(run)
+        failing.refresh_from_db()
+        assert (run.status, run.errors, failing.status, failing.attempts, failing.error) == ('RU', [], 'QU', 0, None)
+        self.process_all(run)
+        assert (run.status, run.assets_processed, run.rows_written) == ('DO', 5, 5 * 12)
+
+    def test_cancel(self, run):
+        unit: DepreciationWorkUnit = claim_unit('worker', run=run)
+        cancel_run(run)
+        assert list(run.work_unit_run.order_by('pk').values_list('status', flat=True)) == ['RU', 'CA', 'CA']
+        assert claim_unit('worker', run=run) is None
+        # The running unit is committed, the run stays cancelled
+        process_unit(unit)
+        run.refresh_from_db()
+        assert (run.status, run.assets_processed) == ('CA', 2)
+        resume_run(run)
+        self.process_all(run)
+        assert (run.status, run.assets_processed) == ('DO', 5)
+
+
+class TestNextBatch:
+    @staticmethod
+    def get_tenant(batches: int) -> Tenant:
+        return Tenant(SimpleNamespace(get_batches=lambda: iter([[index] for index in range(batches)])))
+
+    def test_max_per_user(self):
+        tenants = [self.get_tenant(5), self.get_tenant(1), self.get_tenant(0)]
+        position, started = 0, []
+        while True:
+            position, tenant, batch = Command.next_batch(tenants, 2, position)
+            if tenant is None:
+                break
+            tenant.in_flight += 1
+            started.append((tenants.index(tenant), batch))
+        assert started == [(0, [0]), (1, [0]), (0, [1])]
+        assert [tenant.in_flight for tenant in tenants] == [2, 1, 0]
+        assert [tenant.exhausted for tenant in tenants] == [False, True, True]
+
+    def test_exhausted_tenants_are_skipped(self):
+        tenants = [self.get_tenant(4), self.get_tenant(2), self.get_tenant(0)]
+        position, in_flight, started = 0, [], []
+        while True:
+            # 3 workers, at most 2 batches per user
+            while len(in_flight) < 3:
+                position, tenant, batch = Command.next_batch(tenants, 2, position)
+                if tenant is None:
+                    break
+                tenant.in_flight += 1
+                assert tenant.in_flight <= 2
+                in_flight.append(tenant)
+                started.append((tenants.index(tenant), batch[0]))
+            for tenant in tenants:
+                if tenant.exhausted:
+                    # next() on it would fail
+                    tenant.batches = None
+            if not in_flight:
+                break
+            in_flight.pop(0).in_flight -= 1
+        assert sorted(started) == [(0, 0), (0, 1), (0, 2), (0, 3), (1, 0), (1, 1)]
+        assert all(tenant.exhausted for tenant in tenants)
+
+
+class TestRunDiff:
+    january, february, march = date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31)
+    posted = {1: {january: 100.0, february: 100.0}, 2: {january: 100.0, february: 100.0},
+              3: {january: 50.0, february: 50.0}, 4: {january: 50.0}}
+
+    @pytest.fixture(autouse=True)
+    def get_posted(self, monkeypatch):
+        monkeypatch.setattr(RunDiff, 'get_posted',
+                            staticmethod(lambda assets: {asset.pk: dict(self.posted[asset.pk]) for asset in assets}))
+
+    @staticmethod
+    def get_asset(pk: int, asset_type_id: int, purchase_price: float, book_value: float) -> SimpleNamespace:
+        return SimpleNamespace(pk=pk, asset_number='A-{}'.format(pk), asset_type_id=asset_type_id,
+                               purchase_price=purchase_price, book_value=book_value)
+
+    def add_first(self, diff: RunDiff) -> RunDiff:
+        # Recomputed with a lower February and a new month, and a new month appended
+        first, second = self.get_asset(1, 10, 6000, 5800.0), self.get_asset(2, 10, 6000, 5800.0)
+        return diff.add([first], [(first, [self.january, self.february, self.march], [100.0, 90.0, 90.0]),
+                                  (second, [self.march], [100.0])])
+
+    def add_last(self, diff: RunDiff) -> RunDiff:
+        # Recomputed with a shorter schedule, and nothing to append
+        third, fourth = self.get_asset(3, 20, 1000, 900.0), self.get_asset(4, 20, 1000, 950.0)
+        return diff.add([third], [(third, [self.january], [50.0]), (fourth, [], [])])
+
+    def test_add(self):
+        diff: RunDiff = self.add_last(self.add_first(RunDiff()))
+        assert diff.totals == {'assets': 4, 'assets_changed': 3, 'rows_added': 2, 'rows_changed': 1,
+                               'rows_removed': 1, 'depreciation_before': 550.0, 'depreciation_after': 680.0,
+                               'book_value_before': 13450.0, 'book_value_after': 13320.0}
+        assert [(asset['asset_pk'], asset['rows_added'], asset['rows_changed'], asset['rows_removed'],
+                 asset['book_value_after']) for asset in diff.assets] == [
+            (1, 1, 1, 0, 5720.0), (2, 1, 0, 0, 5700.0), (3, 0, 0, 1, 950.0)]
+
+    def test_merge(self):
+        diff: RunDiff = self.add_last(self.add_first(RunDiff()))
+        merged: RunDiff = self.add_first(RunDiff()).merge(self.add_last(RunDiff()))
+        assert merged.totals == diff.totals
+        assert merged.assets == diff.assets
+        assert merged.asset_types == diff.asset_types
+        assert merged.asset_types[10] == {'asset_type_pk': 10, 'assets': 2, 'depreciation_before': 400.0,
+                                          'depreciation_after': 580.0, 'book_value_before': 11600.0,
+                                          'book_value_after': 11420.0}
+        assert merged.asset_types[20]['depreciation_after'] == 100.0
+
+
+class TestPostScheduleChanges:
+    @staticmethod
+    def post(user: CustomUser, purchase_price: float = 6000) -> Asset:
+        # 180 a month (20% of the cost limit less the residual value) until the purchase price less the residual
+        # value is depreciated : 27 months for the other assets, up to March 2025
+        Asset.objects.filter(user=user).update(cost_limit=12000, residual_value=1200)
+        asset: Asset = Asset.objects.filter(user=user).order_by('pk').first()
+        Asset.objects.filter(pk=asset.pk).update(purchase_price=purchase_price)
+        post_catch_up_schedules(user, list(Asset.objects.filter(user=user).order_by('pk')), to_date=date(2029, 1, 1))
+        return Asset.objects.get(pk=asset.pk)
+
+    @staticmethod
+    def get_rows(asset: Asset) -> list:
+        return list(CalculatedDepreciation.objects.filter(asset=asset).order_by('depreciation_date')
+                    .values_list('pk', 'depreciation_date', 'depreciation_of'))
+
+    def test_no_change(self, portfolio):
+        asset: Asset = self.post(portfolio)
+        rows: list = self.get_rows(asset)
+        assert len(rows) == 27
+        assert post_schedule_changes(portfolio, asset) is None
+        assert self.get_rows(asset) == rows
+
+    def test_change_in_the_middle(self, portfolio):
+        asset: Asset = self.post(portfolio)
+        rows: list = self.get_rows(asset)
+        CalculatedDepreciation.objects.filter(asset=asset, depreciation_date=date(2023, 6, 30)).update(
+            depreciation_of=50)
+        assert post_schedule_changes(portfolio, asset) == date(2023, 6, 30)
+        new_rows: list = self.get_rows(asset)
+        # Months before are kept as they are, the others are posted again
+        assert new_rows[:5] == rows[:5]
+        assert [row[1:] for row in new_rows] == [row[1:] for row in rows]
+        asset.refresh_from_db()
+        assert (asset.book_value, asset.depreciated_to) == (1200, date(2025, 3, 31))
+
+    def test_shorter_schedule(self, portfolio):
+        asset: Asset = self.post(portfolio)
+        rows: list = self.get_rows(asset)
+        asset.purchase_price = 4800
+        asset.save()
+        assert post_schedule_changes(portfolio, asset) == date(2024, 9, 30)
+        # Only the kept rows are left, the book value is the one of their last month
+        assert self.get_rows(asset) == rows[:20]
+        asset.refresh_from_db()
+        assert (asset.book_value, asset.depreciated_to, asset.fully_depreciated_at) == (
+            1200, date(2024, 8, 31), date(2024, 8, 31))
+
+    def test_longer_schedule(self, portfolio):
+        asset: Asset = self.post(portfolio, purchase_price=4800)
+        rows: list = self.get_rows(asset)
+        assert len(rows) == 20
+        asset.purchase_price = 6000
+        asset.save()
+        # Up to the last run date of the other assets
+        assert post_schedule_changes(portfolio, asset) == date(2024, 9, 30)
+        new_rows: list = self.get_rows(asset)
+        assert new_rows[:20] == rows
+        assert [row[1:] for row in new_rows[20:]] == list(zip(
+            get_month_ends('2024-09-01', date(2025, 4, 1)), [180.0] * 6 + [120.0]))
+        asset.refresh_from_db()
+        assert (asset.book_value, asset.depreciated_to) == (1200, date(2025, 3, 31))
+
+
+class TestSelectAssets:
+    def test_errors_per_asset(self, portfolio):
+        assets = list(Asset.objects.filter(user=portfolio).order_by('pk'))
+        other_user: CustomUser = CustomUser.objects.create_user('other@example.com', 'other')
+        other_asset: Asset = Asset.objects.create(user=other_user, asset_name='other', asset_type=assets[0].asset_type)
+        DisposedAsset.objects.create(asset=assets[1], disposal_date=date(2024, 6, 30), disposal_price=100)
+        Asset.objects.filter(pk=assets[2].pk).update(asset_status='DI')
+        Asset.objects.filter(pk=assets[3].pk).update(purchase_price=None, depreciation_start_date=None)
+        asset_pk: str = ','.join(str(pk) for pk in (
+            assets[0].pk, other_asset.pk, assets[1].pk, assets[2].pk, assets[3].pk, 'abc', '', assets[4].pk))
+        selected, results = AssetsRegisterView().select_assets(portfolio, asset_pk)
+        assert [asset.pk for asset in selected] == [assets[0].pk, assets[4].pk]
+        required: list = ['This field is required to register an asset.']
+        assert results == [
+            {'asset_pk': assets[0].pk},
+            {'asset_pk': other_asset.pk, 'errors': {'asset_pk': ['Asset for this user do not exist.']}},
+            {'asset_pk': assets[1].pk, 'errors': {'asset_pk': ['Asset is disposed.']}},
+            {'asset_pk': assets[2].pk, 'errors': {'asset_pk': ['Asset is disposed.']}},
+            {'asset_pk': assets[3].pk, 'errors': {'purchase_price': required, 'depreciation_start_date': required}},
+            {'asset_pk': 'abc', 'errors': {'asset_pk': ['Asset for this user do not exist.']}},
+            {'asset_pk': assets[4].pk},
+        ]
+
+    def test_deleted_asset_does_not_exist(self, portfolio):
+        asset: Asset = Asset.objects.filter(user=portfolio).first()
+        Asset.objects.filter(pk=asset.pk).update(deleted_at=timezone.now())
+        selected, results = AssetsRegisterView().select_assets(portfolio, asset.pk)
+        assert selected == []
+        assert results == [{'asset_pk': asset.pk, 'errors': {'asset_pk': ['Asset for this user do not exist.']}}]
+
+
+class TestYtdDepreciation:
+    def test_summary_and_schedule_agree(self, portfolio):
+        # 100 a month from January 2023
+        post_catch_up_schedules(portfolio, list(Asset.objects.filter(user=portfolio)), to_date=date(2024, 5, 31))
+        assets = Asset.objects.filter(user=portfolio)
+        # Summary of another year : from the schedule
+        assert set(annotate_ytd_depreciation(assets, today=date(2024, 6, 15))
+                   .values_list('ytd_depreciation', flat=True)) == {500.0}
+        assets.update(ytd_year=2024, year_start_accumulated_depreciation=1200)
+        assert set(annotate_ytd_depreciation(assets, today=date(2024, 6, 15))
+                   .values_list('ytd_depreciation', flat=True)) == {500.0}
+        # Rows posted after today are not counted
+        assert set(annotate_ytd_depreciation(assets, today=date(2024, 3, 15))
+                   .values_list('ytd_depreciation', flat=True)) == {200.0}
@@ -3,7 +3,7 @@ from .views import (AssetSettingsView, AssetTypesView, AssetsView,
                     ListAssetsView, AssetNumbersView, AssetRunDepreciationView,
                     AssetsRegisterView, AssetsDraftView, AssetsRollBackDepreciationView,
                     AssetsDisposeView, ListAssetsDisposedView, AssetsUndisposeView,
-                    AssetNumberView)
+                    AssetNumberView, AssetBookValueView, AssetsDisposeBatchView)
 
 app_name = 'fixed_assets'
 
@@ -31,17 +31,23 @@ urlpatterns = [
     path('assets-list/', ListAssetsView.as_view()),
     # GET : Tab asset_status numbers
     path('asset-numbers/', AssetNumbersView.as_view()),
-    # POST : Run depreciation
+    # POST : Queue a depreciation run (synchronous=true : run it in the request, dry_run=true : changes it would make)
+    # GET : Depreciation run status and progress
     path('asset-run-depreciation/', AssetRunDepreciationView.as_view()),
+    path('asset-run-depreciation/<int:run_pk>/', AssetRunDepreciationView.as_view()),
     # POST : Run rollback
     path('asset-run-rollback/', AssetsRollBackDepreciationView.as_view()),
     # GET : Dispose Asset details
     # POST : Dispose Asset
     path('asset-dispose/', AssetsDisposeView.as_view()),
+    # POST : Preview (preview=true) or dispose a list of assets
+    path('asset-dispose-batch/', AssetsDisposeBatchView.as_view()),
     # POST : Undispose Asset
     path('asset-undispose/', AssetsUndisposeView.as_view()),
     # GET : Get disposed assets list
     path('asset-dispose-list/', ListAssetsDisposedView.as_view()),
     # GET : Get last asset number
     path('asset-number/', AssetNumberView.as_view()),
+    # GET : Book value of one asset (asset_pk) or of the portfolio as of a date (as_of)
+    path('book-value/', AssetBookValueView.as_view()),
 ]
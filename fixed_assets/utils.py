@@ -1,38 +1,82 @@
-from collections import OrderedDict
-from typing import Union, Literal, List, Dict, Any
+from dataclasses import dataclass
+from typing import Union, Literal, List, Dict, Any, Tuple, Callable
 from datetime import date, datetime, timedelta
-from calendar import isleap, monthrange
 
-from cffi.backend_ctypes import xrange
-from django.db.models import QuerySet, Sum
-from rest_framework.exceptions import NotFound
+from django.db.models import QuerySet, OuterRef, Subquery, Case, When, F, Q
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import NotFound, ValidationError
 
 from .models import Asset, CalculatedDepreciation
+from .periods import get_month_ends, days_in_year, month_end, parse_date
+
+
+@dataclass(frozen=True)
+class AssetParams:
+    # Depreciation inputs of one asset, built once : start date parsed, blanks (None) normalized to 0
+    __slots__ = ('start_date', 'purchase_price', 'cost_limit', 'residual_value', 'averaging_method', 'rate',
+                 'effective_life', 'depreciation_method', 'days_in_year', 'days_in_month')
+    start_date: Union[date, None]
+    purchase_price: float
+    cost_limit: float
+    residual_value: float
+    averaging_method: Union[Literal['FM', 'AD'], None]
+    rate: float
+    effective_life: float
+    depreciation_method: Union[str, None]
+    # Days of the start date year, days from the start date to the end of its month (at least 1),
+    # only actual days (AD) averaging needs them, None without start date
+    days_in_year: Union[int, None]
+    days_in_month: Union[int, None]
+
+    @classmethod
+    def create(cls, start_date: Union[date, datetime, str, None], purchase_price=None, cost_limit=None,
+               residual_value=None, averaging_method=None, rate=None, effective_life=None,
+               depreciation_method=None) -> 'AssetParams':
+        start: Union[date, None] = None
+        if start_date:
+            start = parse_date(start_date.split(' ')[0] if isinstance(start_date, str) else start_date)
+        return cls(start_date=start,
+                   purchase_price=float(purchase_price or 0),
+                   cost_limit=float(cost_limit or 0),
+                   residual_value=float(residual_value or 0),
+                   averaging_method=averaging_method,
+                   rate=float(rate or 0),
+                   effective_life=float(effective_life or 0),
+                   depreciation_method=depreciation_method,
+                   days_in_year=days_in_year(start) if start else None,
+                   # Ensure the result is at least 1 to avoid division by zero
+                   days_in_month=max((month_end(start) - start).days, 1) if start else None)
+
+    @classmethod
+    def from_kwargs(cls, kwargs: Dict[str, Any]) -> 'AssetParams':
+        return cls.create(kwargs.get('depreciation_start_date'), kwargs.get('purchase_price'),
+                          kwargs.get('cost_limit'), kwargs.get('residual_value'), kwargs.get('averaging_method'),
+                          kwargs.get('rate'), kwargs.get('effective_life'), kwargs.get('depreciation_method'))
+
+    @classmethod
+    def from_asset(cls, asset: Asset, start_date: Union[date, datetime, str]) -> 'AssetParams':
+        return cls.create(start_date, asset.purchase_price, asset.cost_limit, asset.residual_value,
+                          asset.averaging_method, asset.rate, asset.effective_life, asset.depreciation_method)
 
 
 class Init:
-    def __init__(self, kwargs):
-        self.kwargs: Dict[str, Any] = kwargs
-        self.start_date: str = kwargs.get('depreciation_start_date')
-        self.purchase_price: Union[float, int] = kwargs.get('purchase_price')
-        self.cost_limit: Union[float, int] = kwargs.get('cost_limit', 0)
-        self.residual_value: Union[float, int] = kwargs.get('residual_value', 0)
-        self.averaging_method: Literal['FM', 'AD'] = kwargs.get('averaging_method')
-        self.rate: Union[float, int, bool] = kwargs.get('rate', False)
-        self.effective_life: Union[float, int, bool] = kwargs.get('effective_life', False)
-        self.depreciation_method: Union[Literal['100', '150', '200'], None] = kwargs.get('depreciation_method', None)
+    def __init__(self, kwargs: Union[Dict[str, Any], AssetParams]):
+        self.kwargs: Union[Dict[str, Any], AssetParams] = kwargs
+        self.params: AssetParams = kwargs if isinstance(kwargs, AssetParams) else AssetParams.from_kwargs(kwargs)
+        self.start_date: Union[date, None] = self.params.start_date
+        self.purchase_price: float = self.params.purchase_price
+        self.cost_limit: float = self.params.cost_limit
+        self.residual_value: float = self.params.residual_value
+        self.averaging_method: Literal['FM', 'AD'] = self.params.averaging_method
+        self.rate: float = self.params.rate
+        self.effective_life: float = self.params.effective_life
+        self.depreciation_method: Union[Literal['100', '150', '200'], None] = self.params.depreciation_method
 
     def days_in_year(self) -> int:
-        year: List[str] = str(self.start_date).split('-')
-        return 365 + isleap(int(year[0]))
+        return self.params.days_in_year
 
     def number_of_days_in_month(self) -> int:
-        date_object: date = datetime.strptime(str(self.start_date).split(' ')[0], '%Y-%m-%d').date()
-        last_month_day: int = monthrange(date_object.year, date_object.month)[1]
-        last_date: date = date(date_object.year, date_object.month, last_month_day)
-        delta: timedelta = last_date - date_object
-        # return delta.days if delta.days > 0 else 1
-        return max(delta.days, 1)  # Ensure the result is at least 1 to avoid division by zero
+        return self.params.days_in_month
 
 
 class StraightLine(Init):
@@ -238,241 +282,203 @@ class DecliningBalanceBy100Or150Or200(Init):
         return round(result, 2)
 
 
-class DisposeAsset:
-    def __init__(self, kwargs):
-        self.kwargs: Dict[str, Any] = kwargs
-        self.user = kwargs['user']
-        self.dispose_date = kwargs['dispose_date']
-        self.sale_proceeds = kwargs['sale_proceeds']
-        self.proceeds_account_pk = kwargs['proceeds_account_pk']
-        self.depreciation_date = kwargs['depreciation_date']
-        self.asset_pk = kwargs['asset_pk']
-        self.depreciation_to_be_posted_date = None
-        self.reversal_of_depreciation_date_start: Union[date, None] = None
-        self.reversal_of_depreciation_date_end: Union[date, None] = None
+DECLINING_BALANCE_FACTORS: Dict[str, float] = {
+    '100': 1.0,
+    '150': 1.5,
+    '200': 2.0,
+}
+# Kernel kinds, how the base amount turns into the depreciation of a period
+CONSTANT = 'constant'  # base (full month)
+PER_DAY = 'per_day'  # base / (days_in_year * days_in_month)
+PRORATED = 'prorated'  # (base / days_in_year) * days_in_month
+
+
+@dataclass(frozen=True)
+class Kernel:
+    # Depreciation of one asset compiled once : only the day counts change from one period to the next.
+    # The operations are applied in the same order as the calculators above, results are identical.
+    __slots__ = ('kind', 'base', 'factor')
+    kind: str
+    base: float
+    factor: float
+
+    def calculate(self, days_in_year: int, days_in_month: int) -> float:
+        if self.kind == PER_DAY:
+            result: float = self.base / (days_in_year * days_in_month)
+        elif self.kind == PRORATED:
+            result: float = (self.base / days_in_year) * days_in_month
+        else:
+            result: float = self.base
+        return round(result * self.factor, 2)
 
-    @staticmethod
-    def generate_data_for_depreciation(asset: Union[QuerySet, Asset, CalculatedDepreciation],
-                                       new_last_date: datetime) -> dict:
-        return {
-            'asset_name': asset.asset_name,
-            'asset_number': asset.asset_number,
-            'purchase_date': asset.purchase_date,
-            'purchase_price': float(asset.purchase_price) if asset.purchase_price else None,
-            'warranty_expiry': asset.warranty_expiry,
-            'serial_number': asset.serial_number,
-            'asset_type': asset.asset_type,
-            'region': asset.region,
-            'description': asset.description,
-            'depreciation_start_date': new_last_date,
-            'cost_limit': float(asset.cost_limit) if asset.cost_limit else None,
-            'residual_value': float(asset.residual_value) if asset.residual_value else None,
-            'depreciation_method': asset.depreciation_method,
-            'averaging_method': asset.averaging_method,
-            'rate': float(asset.rate) if asset.rate else None,
-            'effective_life': float(asset.effective_life) if asset.effective_life else None,
-        }
 
-    def get_dispose_date(self) -> datetime:
-        return datetime.strptime(self.dispose_date, "%Y-%m-%d")
+NO_DEPRECIATION: Kernel = Kernel(CONSTANT, 0.0, 1.0)
 
-    def get_depreciation_date(self) -> datetime:
-        return datetime.strptime(self.depreciation_date, "%Y-%m-%d")
 
-    def get_last_depreciation_date(self) -> datetime:
-        return datetime.combine((CalculatedDepreciation.objects.filter(asset=self.asset_pk, asset__user=self.user)
-                                 .latest('depreciation_date').depreciation_date),
-                                datetime.min.time())
+def get_depreciation_basis(params: AssetParams) -> float:
+    cost: float = params.cost_limit if params.cost_limit else params.purchase_price
+    return cost - params.residual_value if params.residual_value else cost
 
-    def get_accumulated_depreciation(self) -> float:
-        return ((CalculatedDepreciation.objects.filter(asset=self.asset_pk, asset__user=self.user)
-                 .aggregate(Sum('depreciation_of')))
-                .get('depreciation_of__sum'))
 
-    @staticmethod
-    def get_list_of_dates(from_date: str, to_date: str) -> list:
-        dates = [from_date, to_date]
-        start, end = [datetime.strptime(_, "%Y-%m-%d") for _ in dates]
-        result = OrderedDict(((start + timedelta(_)).strftime(r"%m-%Y"), None)
-                             for _ in xrange((end - start).days)).keys()
-        last_dates = []
-        for i in list(result):
-            date_object: date = datetime.strptime(i, '%m-%Y').date()
-            last_month_day: int = monthrange(date_object.year, date_object.month)[1]
-            last_date: date = date(date_object.year, date_object.month, last_month_day)
-            last_dates.append(last_date)
-        return last_dates
-
-    def get_accumulated_depreciations_till_date(self, asset: Union[QuerySet, Asset, CalculatedDepreciation]):
-        accumulated_depreciation: float = ((CalculatedDepreciation.objects.filter(asset=self.asset_pk,
-                                                                                  asset__user=self.user)
-                                            .aggregate(Sum('depreciation_of')))
-                                           .get('depreciation_of__sum'))
-        book_value = 0
-        data_: dict = self.generate_data_for_depreciation(asset, self.get_depreciation_date())
-        start_date = (CalculatedDepreciation.objects.filter(asset=self.asset_pk, asset__user=self.user)
-                      .latest('depreciation_date').depreciation_date)
-        start_date_str: str = str(start_date)
-        list_of_dates: list = self.get_list_of_dates(start_date_str, self.depreciation_date)
-        for date_ in list_of_dates:
-            if self.get_depreciation_date() < datetime.combine(date_, datetime.min.time()):
-                list_of_dates.remove(date_)
-        if list_of_dates.__len__() == 0:
-            self.reversal_of_depreciation_date_start = datetime.strptime(
-                '{}-{}-1'.format(start_date.year, start_date.month), "%Y-%m-%d")
-            self.reversal_of_depreciation_date_end = self.get_depreciation_date()
-        for date_ in list_of_dates:
-            self.depreciation_to_be_posted_date = date_
-            if asset.depreciation_method == 'ST':
-                book_value: Union[float, int] = book_value + StraightLine(data_).calculate_depreciation()
-            elif asset.depreciation_method in ['100', '150', '200']:
-                book_value: Union[float, int] = book_value + (DecliningBalanceBy100Or150Or200(data_)
-                                                              .calculate_depreciation())
-            elif asset.depreciation_method == 'FD':
-                book_value: Union[float, int] = book_value + FullDepreciation(data_).calculate_depreciation()
-            else:
-                book_value: Union[float, int] = book_value + 0
-        return accumulated_depreciation, book_value
+def compile_straight_line(params: AssetParams) -> Kernel:
+    basis: float = get_depreciation_basis(params)
+    # Without cost limit and residual value, actual days use a different formula
+    plain: bool = not params.cost_limit and not params.residual_value
+    kernel: Kernel = NO_DEPRECIATION
+    if params.rate and params.averaging_method == 'FM':
+        kernel = Kernel(CONSTANT, ((basis * params.rate) / 100) / 12, 1.0)
+    elif params.rate and params.averaging_method == 'AD':
+        kernel = (Kernel(PRORATED, params.purchase_price * (params.rate / 100), 1.0) if plain
+                  else Kernel(PER_DAY, (basis * params.rate) / 100, 1.0))
+    # Effective life overrides rate when both are set
+    if params.effective_life and params.averaging_method == 'FM':
+        kernel = Kernel(CONSTANT, get_full_month_by_effective_life(params, basis), 1.0)
+    elif params.effective_life and params.averaging_method == 'AD':
+        kernel = (Kernel(PRORATED, params.purchase_price / params.effective_life, 1.0) if plain
+                  else Kernel(PER_DAY, basis / params.effective_life, 1.0))
+    return kernel
 
-    def dispose_till_last_date(self, asset: Union[QuerySet, Asset, CalculatedDepreciation]) -> dict:
-        data: Dict[str, Union[float, str]] = {
-            'cost': asset.purchase_price,
-            'current_accumulated_depreciation': self.get_accumulated_depreciation(),
-            'sale_proceeds': float(self.sale_proceeds)
-        }
-        # Case 1 : price == sale price
-        if asset.purchase_price == float(self.sale_proceeds):
-            data['gain_on_disposal'] = self.get_accumulated_depreciation()
-        # Case 2 : price < sale price
-        elif asset.purchase_price < float(self.sale_proceeds):
-            data['gain_on_disposal'] = self.get_accumulated_depreciation()
-            data['capital_gain'] = float(self.sale_proceeds) - asset.purchase_price
-        # Case 3 : price > sale price
-        else:
-            if (asset.purchase_price - float(self.sale_proceeds) - self.get_accumulated_depreciation()) > 0:
-                data['loss_on_disposal'] = (asset.purchase_price - float(self.sale_proceeds) -
-                                            self.get_accumulated_depreciation())
-        return data
 
-    def dispose_with_extra_days(self, asset: Union[QuerySet, Asset, CalculatedDepreciation]) -> dict:
-        accumulated_depreciation, book_value = self.get_accumulated_depreciations_till_date(asset)
-        data: Dict[str, Union[float, str]] = {
-            'cost': asset.purchase_price,
-            'current_accumulated_depreciation': accumulated_depreciation,
-        }
-        if self.get_last_depreciation_date() != datetime.combine(self.depreciation_to_be_posted_date,
-                                                                 datetime.min.time()):
-            data['depreciation_to_be_posted'] = accumulated_depreciation
-            data['depreciation_to_be_posted_date'] = self.depreciation_to_be_posted_date
-        data['sale_proceeds'] = float(self.sale_proceeds)
-        # Case 1 : price == sale price
-        gain_on_disposal: float = (float(self.sale_proceeds) + book_value) - asset.purchase_price
-
-        if asset.purchase_price == float(self.sale_proceeds):
-            data['gain_on_disposal'] = book_value
-        # Case 2 : price < sale price
-        elif asset.purchase_price < float(self.sale_proceeds):
-            data['gain_on_disposal'] = book_value
-            data['capital_gain'] = float(self.sale_proceeds) - asset.purchase_price
-        # Case 3 : price > sale price
-        else:
-            if gain_on_disposal > 0:
-                data['gain_on_disposal'] = gain_on_disposal
-            else:
-                data['loss_on_disposal'] = abs(gain_on_disposal)
-        return data
+def get_full_month_by_effective_life(params: AssetParams, basis: float) -> float:
+    # Cost limit without residual value is multiplied by the effective life, as in the calculators
+    if params.cost_limit and not params.residual_value:
+        return (params.cost_limit * params.effective_life) / 12
+    return (basis / params.effective_life) / 12
 
-    def dispose_with_less_days(self, asset: Union[QuerySet, Asset, CalculatedDepreciation]) -> dict:
-        accumulated_depreciation, book_value = self.get_accumulated_depreciations_till_date(asset)
-        data: Dict[str, Union[float, str]] = {
-            'cost': asset.purchase_price,
-            'current_accumulated_depreciation': accumulated_depreciation,
-        }
-        if (self.reversal_of_depreciation_date_start < self.reversal_of_depreciation_date_end <
-                self.get_last_depreciation_date()):
-            # 24-01-31
-            reversal_from = "{}/{}/{}".format(self.reversal_of_depreciation_date_start.year,
-                                              self.reversal_of_depreciation_date_start.month,
-                                              self.reversal_of_depreciation_date_start.day)
-            reversal_to = "{}/{}/{}".format(self.get_last_depreciation_date().year,
-                                            self.get_last_depreciation_date().month,
-                                            self.get_last_depreciation_date().day)
-            reversal_date = '{} to {}'.format(reversal_from, reversal_to)
-            data['reversal_of_depreciation'] = accumulated_depreciation
-            data['reversal_of_depreciation_date'] = reversal_date
-        data['sale_proceeds'] = float(self.sale_proceeds)
-        # Case 1 : price == sale price
-        gain_on_disposal: float = (float(self.sale_proceeds) + book_value) - asset.purchase_price
-        if asset.purchase_price == float(self.sale_proceeds):
-            if book_value > 0:
-                data['gain_on_disposal'] = book_value
-        # Case 2 : price < sale price
-        elif asset.purchase_price < float(self.sale_proceeds):
-            if book_value > 0:
-                data['gain_on_disposal'] = book_value
-            data['capital_gain'] = float(self.sale_proceeds) - asset.purchase_price
-        # Case 3 : price > sale price
-        else:
-            if gain_on_disposal > 0:
-                data['gain_on_disposal'] = gain_on_disposal
-            else:
-                data['loss_on_disposal'] = abs(gain_on_disposal)
-        return data
 
-    def calculate_journal(self):
-        try:
-            asset: Union[QuerySet, Asset, CalculatedDepreciation] = (
-                Asset.objects.prefetch_related('calculated_depreciation_asset')
-                .get(user=self.user, pk=self.asset_pk))
-            # Case 1 : date == last depreciation date
-            if self.get_depreciation_date() == self.get_last_depreciation_date():
-                print('CASE 1')
-                data = self.dispose_till_last_date(asset)
-            # Case 2 : Date is more than depreciation last date so it has to calculate new depreciation
-            elif self.get_depreciation_date() > self.get_last_depreciation_date():
-                print('CASE 2')
-                data = self.dispose_with_extra_days(asset)
-            else:
-                print('CASE 3')
-                data = self.dispose_with_less_days(asset)
-            return data
-        except Asset.DoesNotExist:
-            raise NotFound('Asset for this user do not exist.')
+def compile_declining_balance(params: AssetParams) -> Kernel:
+    # The calculators cannot run without an effective life, nothing is depreciated
+    if not params.effective_life:
+        return NO_DEPRECIATION
+    factor: float = DECLINING_BALANCE_FACTORS.get(params.depreciation_method, 1.0)
+    basis: float = get_depreciation_basis(params)
+    if params.averaging_method == 'FM':
+        return Kernel(CONSTANT, get_full_month_by_effective_life(params, basis), factor)
+    if params.averaging_method == 'AD':
+        if not params.cost_limit and not params.residual_value:
+            return Kernel(PRORATED, params.purchase_price / params.effective_life, factor)
+        return Kernel(PER_DAY, basis / params.effective_life, factor)
+    return NO_DEPRECIATION
+
+
+def compile_full_depreciation(params: AssetParams) -> Kernel:
+    return NO_DEPRECIATION
+
+
+# Depreciation method : kernel compiler, methods missing here (ND) are not depreciated
+DEPRECIATION_KERNELS: Dict[str, Callable[[AssetParams], Kernel]] = {
+    'ST': compile_straight_line,
+    '100': compile_declining_balance,
+    '150': compile_declining_balance,
+    '200': compile_declining_balance,
+    'FD': compile_full_depreciation,
+}
+
+
+def compile_kernel(params: AssetParams) -> Union[Kernel, None]:
+    compiler: Union[Callable[[AssetParams], Kernel], None] = DEPRECIATION_KERNELS.get(params.depreciation_method)
+    return compiler(params) if compiler else None
+
+
+def calculate_depreciation(params: AssetParams) -> Union[float, int]:
+    # Depreciation of the period starting on params.start_date
+    kernel: Union[Kernel, None] = compile_kernel(params)
+    return kernel.calculate(params.days_in_year, params.days_in_month) if kernel else 0
+
+
+def get_depreciable_amount(purchase_price: Union[float, int, None],
+                           residual_value: Union[float, None]) -> Union[float, int]:
+    # Depreciation posted until the book value reaches the residual value (or zero)
+    return max(int(purchase_price or 0) - (residual_value or 0), 0)
+
+
+def cap_period_depreciation(depreciation: Union[float, int], remaining: Union[float, int]) -> Union[float, int]:
+    # Depreciation of a period, without taking the book value under the residual value
+    return depreciation if depreciation <= remaining else round(max(remaining, 0), 2)
+
+
+def calculate_capped_depreciation(params: AssetParams) -> Union[float, int]:
+    # Depreciation of the first period of a schedule
+    return cap_period_depreciation(calculate_depreciation(params),
+                                   get_depreciable_amount(params.purchase_price, params.residual_value))
+
+
+def get_book_value(purchase_price: Union[float, int, None], accumulated_depreciation: Union[float, None]) -> float:
+    return int(purchase_price or 0) - (accumulated_depreciation or 0)
+
+
+def annotate_book_values_as_of(assets: QuerySet, as_of: date) -> QuerySet:
+    # Running total of the last schedule row on or before as_of, an index lookup per asset instead of a SUM
+    accumulated_depreciation: QuerySet = (CalculatedDepreciation.objects
+                                          .filter(asset=OuterRef('pk'), depreciation_date__lte=as_of)
+                                          .order_by('-depreciation_date').values('accumulated_depreciation')[:1])
+    return assets.annotate(accumulated_depreciation_as_of=Coalesce(Subquery(accumulated_depreciation), 0.0))
+
+
+def annotate_ytd_depreciation(assets: QuerySet, today: Union[date, None] = None) -> QuerySet:
+    # Depreciation from 1 January up to today, read from the summary while it is for this year and nothing is posted
+    # after today. Otherwise from the running totals of the schedule, in the same query.
+    today = today or date.today()
+    year_start: date = today.replace(month=1, day=1)
+    calculated_depreciations: QuerySet = (CalculatedDepreciation.objects.filter(asset=OuterRef('pk'))
+                                          .order_by('-depreciation_date').values('accumulated_depreciation'))
+    accumulated_to_date = Coalesce(Subquery(calculated_depreciations.filter(depreciation_date__lte=today)[:1]), 0.0)
+    accumulated_before = Coalesce(Subquery(calculated_depreciations.filter(depreciation_date__lt=year_start)[:1]),
+                                  0.0)
+    return assets.annotate(ytd_depreciation=Case(
+        When(Q(ytd_year=today.year) & (Q(depreciated_to=None) | Q(depreciated_to__lte=today)),
+             then=F('accumulated_depreciation') - F('year_start_accumulated_depreciation')),
+        default=accumulated_to_date - accumulated_before))
+
+
+def book_value_as_of(asset: Asset, as_of: date) -> float:
+    accumulated_depreciation: Union[float, None] = (CalculatedDepreciation.objects
+                                                    .filter(asset=asset, depreciation_date__lte=as_of)
+                                                    .order_by('-depreciation_date')
+                                                    .values_list('accumulated_depreciation', flat=True).first())
+    return get_book_value(asset.purchase_price, accumulated_depreciation)
 
 
 class DisposeAsset2:
+    # The asset and its schedule are fetched once (two queries), the journal is computed in memory
     def __init__(self, kwargs):
         self.kwargs: Dict[str, Any] = kwargs
         self.user = kwargs['user']
         self.dispose_date = kwargs['dispose_date']
         self.sale_proceeds = kwargs['sale_proceeds']
-        self.depreciation_date = kwargs['depreciation_date']
-        self.asset_pk = kwargs['asset_pk']
-        self.depreciation_to_be_posted_date = None
-        self.reversal_of_depreciation_date_start: Union[date, None] = None
-        self.reversal_of_depreciation_date_end: Union[date, None] = None
+        self.depreciation_date = kwargs.get('depreciation_date')
+        self.asset_pk = kwargs.get('asset_pk')
+        # Already fetched asset / schedule [(depreciation_date, depreciation_of), ...] ordered by date
+        self.asset: Union[Asset, None] = kwargs.get('asset')
+        self.schedule: Union[List[Tuple[date, float]], None] = kwargs.get('schedule')
+        self.depreciation_to_be_posted_date: Union[date, None] = None
 
     @staticmethod
-    def generate_data_for_depreciation(asset: Union[QuerySet, Asset, CalculatedDepreciation],
-                                       new_last_date: datetime) -> dict:
-        return {
-            'asset_name': asset.asset_name,
-            'asset_number': asset.asset_number,
-            'purchase_date': asset.purchase_date,
-            'purchase_price': float(asset.purchase_price) if asset.purchase_price else None,
-            'warranty_expiry': asset.warranty_expiry,
-            'serial_number': asset.serial_number,
-            'asset_type': asset.asset_type,
-            'region': asset.region,
-            'description': asset.description,
-            'depreciation_start_date': new_last_date,
-            'cost_limit': float(asset.cost_limit) if asset.cost_limit else None,
-            'residual_value': float(asset.residual_value) if asset.residual_value else None,
-            'depreciation_method': asset.depreciation_method,
-            'averaging_method': asset.averaging_method,
-            'rate': float(asset.rate) if asset.rate else None,
-            'effective_life': float(asset.effective_life) if asset.effective_life else None,
-        }
+    def get_schedule(assets: Union[QuerySet, List[Asset]]) -> Dict[int, List[Tuple[date, float]]]:
+        # Schedules of many assets in one query
+        schedules: Dict[int, List[Tuple[date, float]]] = {asset.pk: [] for asset in assets}
+        rows = (CalculatedDepreciation.objects.filter(asset__in=list(schedules))
+                .order_by('asset', 'depreciation_date')
+                .values_list('asset', 'depreciation_date', 'depreciation_of'))
+        for asset_pk, depreciation_date, depreciation_of in rows:
+            schedules[asset_pk].append((depreciation_date, float(depreciation_of or 0)))
+        return schedules
+
+    def load(self) -> Asset:
+        if self.asset is None:
+            try:
+                self.asset = Asset.objects.get(user=self.user, pk=self.asset_pk)
+            except (Asset.DoesNotExist, ValueError, TypeError):
+                raise NotFound('Asset for this user does not exist.')
+        if self.schedule is None:
+            self.schedule = self.get_schedule([self.asset])[self.asset.pk]
+        return self.asset
+
+    def load_depreciated(self) -> Asset:
+        asset: Asset = self.load()
+        if not self.schedule:
+            raise ValidationError({'asset_pk': ['Depreciation of this asset has not been run.']})
+        return asset
 
     def get_dispose_date(self) -> datetime:
         return datetime.strptime(self.dispose_date, "%Y-%m-%d")
@@ -480,170 +486,66 @@ class DisposeAsset2:
     def get_depreciation_date(self) -> datetime:
         return datetime.strptime(self.depreciation_date, "%Y-%m-%d")
 
-    def get_last_depreciation_date(self) -> datetime:
-        return datetime.combine((CalculatedDepreciation.objects.filter(asset=self.asset_pk, asset__user=self.user)
-                                 .latest('depreciation_date').depreciation_date),
-                                datetime.min.time())
-
-    def get_accumulated_depreciation(self) -> float:
-        return ((CalculatedDepreciation.objects.filter(asset=self.asset_pk, asset__user=self.user)
-                 .aggregate(Sum('depreciation_of')))
-                .get('depreciation_of__sum'))
-
-    @staticmethod
-    def get_list_of_dates(from_date: str, to_date: str) -> list:
-        dates = [from_date, to_date]
-        start, end = [datetime.strptime(_, "%Y-%m-%d") for _ in dates]
-        result = OrderedDict(((start + timedelta(_)).strftime(r"%m-%Y"), None)
-                             for _ in xrange((end - start).days)).keys()
-        last_dates = []
-        for i in list(result):
-            date_object: date = datetime.strptime(i, '%m-%Y').date()
-            last_month_day: int = monthrange(date_object.year, date_object.month)[1]
-            last_date: date = date(date_object.year, date_object.month, last_month_day)
-            last_dates.append(last_date)
-        return last_dates
-
-    def get_accumulated_depreciations_till_date(self, asset: Union[QuerySet, Asset, CalculatedDepreciation]):
-        accumulated_depreciation: float = ((CalculatedDepreciation.objects.filter(asset=self.asset_pk,
-                                                                                  asset__user=self.user)
-                                            .aggregate(Sum('depreciation_of')))
-                                           .get('depreciation_of__sum'))
-        book_value = 0
-        data_: dict = self.generate_data_for_depreciation(asset, self.get_depreciation_date())
-        start_date = (CalculatedDepreciation.objects.filter(asset=self.asset_pk, asset__user=self.user)
-                      .latest('depreciation_date').depreciation_date)
-        start_date_str: str = str(start_date)
-        list_of_dates: list = self.get_list_of_dates(start_date_str, self.depreciation_date)
-        for date_ in list_of_dates:
-            if self.get_depreciation_date() < datetime.combine(date_, datetime.min.time()):
-                list_of_dates.remove(date_)
-        if list_of_dates.__len__() == 0:
-            self.reversal_of_depreciation_date_start = datetime.strptime(
-                '{}-{}-1'.format(start_date.year, start_date.month), "%Y-%m-%d")
-            self.reversal_of_depreciation_date_end = self.get_depreciation_date()
-        for date_ in list_of_dates:
-            self.depreciation_to_be_posted_date = date_
-            if asset.depreciation_method == 'ST':
-                book_value: Union[float, int] = book_value + StraightLine(data_).calculate_depreciation()
-            elif asset.depreciation_method in ['100', '150', '200']:
-                book_value: Union[float, int] = book_value + (DecliningBalanceBy100Or150Or200(data_)
-                                                              .calculate_depreciation())
-            elif asset.depreciation_method == 'FD':
-                book_value: Union[float, int] = book_value + FullDepreciation(data_).calculate_depreciation()
-            else:
-                book_value: Union[float, int] = book_value + 0
-        return accumulated_depreciation, book_value
-
-    def dispose_till_last_date(self, asset: Union[QuerySet, Asset, CalculatedDepreciation]) -> dict:
-        data: Dict[str, Union[float, str]] = {
-            'cost': asset.purchase_price,
-            'current_accumulated_depreciation': self.get_accumulated_depreciation(),
-            'sale_proceeds': float(self.sale_proceeds)
-        }
-        # Case 1 : price == sale price
-        if asset.purchase_price == float(self.sale_proceeds):
-            data['gain_on_disposal'] = self.get_accumulated_depreciation()
-        # Case 2 : price < sale price
-        elif asset.purchase_price < float(self.sale_proceeds):
-            data['gain_on_disposal'] = self.get_accumulated_depreciation()
-            data['capital_gain'] = float(self.sale_proceeds) - asset.purchase_price
-        # Case 3 : price > sale price
-        else:
-            if (asset.purchase_price - float(self.sale_proceeds) - self.get_accumulated_depreciation()) > 0:
-                data['loss_on_disposal'] = (asset.purchase_price - float(self.sale_proceeds) -
-                                            self.get_accumulated_depreciation())
-        return data
-
-    def dispose_with_extra_days(self, asset: Union[QuerySet, Asset, CalculatedDepreciation]) -> dict:
-        accumulated_depreciation, book_value = self.get_accumulated_depreciations_till_date(asset)
-        data: Dict[str, Union[float, str]] = {
-            'cost': asset.purchase_price,
-            'current_accumulated_depreciation': accumulated_depreciation,
-        }
-        if self.get_last_depreciation_date() != datetime.combine(self.depreciation_to_be_posted_date,
-                                                                 datetime.min.time()):
-            data['depreciation_to_be_posted'] = accumulated_depreciation
-            data['depreciation_to_be_posted_date'] = self.depreciation_to_be_posted_date
-        data['sale_proceeds'] = float(self.sale_proceeds)
-        # Case 1 : price == sale price
-        gain_on_disposal: float = (float(self.sale_proceeds) + book_value) - asset.purchase_price
-
-        if asset.purchase_price == float(self.sale_proceeds):
-            data['gain_on_disposal'] = book_value
-        # Case 2 : price < sale price
-        elif asset.purchase_price < float(self.sale_proceeds):
-            data['gain_on_disposal'] = book_value
-            data['capital_gain'] = float(self.sale_proceeds) - asset.purchase_price
-        # Case 3 : price > sale price
-        else:
-            if gain_on_disposal > 0:
-                data['gain_on_disposal'] = gain_on_disposal
-            else:
-                data['loss_on_disposal'] = abs(gain_on_disposal)
-        return data
-
-    def dispose_with_less_days(self, asset: Union[QuerySet, Asset, CalculatedDepreciation]) -> dict:
-        accumulated_depreciation, book_value = self.get_accumulated_depreciations_till_date(asset)
-        data: Dict[str, Union[float, str]] = {
+    def get_last_depreciation_date(self) -> date:
+        return self.schedule[-1][0]
+
+    def get_accumulated_depreciation(self, from_date: Union[date, None] = None,
+                                     to_date: Union[date, None] = None) -> Union[float, None]:
+        # Sum of the schedule rows between both dates (included), None when there is no row as in Sum()
+        values: List[float] = [depreciation_of for depreciation_date, depreciation_of in self.schedule
+                               if (from_date is None or depreciation_date >= from_date)
+                               and (to_date is None or depreciation_date <= to_date)]
+        return sum(values) if values else None
+
+    def get_depreciation_till_date(self, asset: Asset) -> float:
+        # Depreciation of every month end from the last posted one up to the depreciation date
+        depreciation_date: date = self.get_depreciation_date().date()
+        list_of_dates: List[date] = [date_ for date_ in
+                                     get_month_ends(self.get_last_depreciation_date(), self.depreciation_date)
+                                     if date_ <= depreciation_date]
+        if not list_of_dates:
+            return 0
+        self.depreciation_to_be_posted_date = list_of_dates[-1]
+        depreciation: Union[float, int] = calculate_depreciation(
+            AssetParams.from_asset(asset, self.get_depreciation_date()))
+        # Every month is depreciated from the depreciation date
+        book_value: Union[float, int] = 0
+        for _ in list_of_dates:
+            book_value = book_value + depreciation
+        remaining: float = (get_depreciable_amount(asset.purchase_price, asset.residual_value) -
+                            (self.get_accumulated_depreciation() or 0))
+        return cap_period_depreciation(book_value, remaining)
+
+    def calculate_journal(self) -> dict:
+        # AD = All depreciation
+        asset: Asset = self.load_depreciated()
+        accumulated_depreciation: float = self.get_accumulated_depreciation()
+        last_depreciation_date: date = self.get_last_depreciation_date()
+        depreciation_date: date = self.get_depreciation_date().date()
+        sale_proceeds: float = float(self.sale_proceeds)
+        data: Dict[str, Union[float, str, date]] = {
             'cost': asset.purchase_price,
             'current_accumulated_depreciation': accumulated_depreciation,
-        }
-        if (self.reversal_of_depreciation_date_start < self.reversal_of_depreciation_date_end <
-                self.get_last_depreciation_date()):
-            # 24-01-31
-            reversal_from = "{}/{}/{}".format(self.reversal_of_depreciation_date_start.year,
-                                              self.reversal_of_depreciation_date_start.month,
-                                              self.reversal_of_depreciation_date_start.day)
-            reversal_to = "{}/{}/{}".format(self.get_last_depreciation_date().year,
-                                            self.get_last_depreciation_date().month,
-                                            self.get_last_depreciation_date().day)
-            reversal_date = '{} to {}'.format(reversal_from, reversal_to)
-            data['reversal_of_depreciation'] = accumulated_depreciation
-            data['reversal_of_depreciation_date'] = reversal_date
-        data['sale_proceeds'] = float(self.sale_proceeds)
-        # Case 1 : price == sale price
-        gain_on_disposal: float = (float(self.sale_proceeds) + book_value) - asset.purchase_price
-        if asset.purchase_price == float(self.sale_proceeds):
-            if book_value > 0:
-                data['gain_on_disposal'] = book_value
-        # Case 2 : price < sale price
-        elif asset.purchase_price < float(self.sale_proceeds):
-            if book_value > 0:
-                data['gain_on_disposal'] = book_value
-            data['capital_gain'] = float(self.sale_proceeds) - asset.purchase_price
-        # Case 3 : price > sale price
-        else:
-            if gain_on_disposal > 0:
-                data['gain_on_disposal'] = gain_on_disposal
-            else:
-                data['loss_on_disposal'] = abs(gain_on_disposal)
-        return data
-
-    def calculate_journal(self):
-        try:
-            asset = Asset.objects.prefetch_related('calculated_depreciation_asset').get(user=self.user,
-                                                                                        pk=self.asset_pk)
-        except Asset.DoesNotExist:
-            raise NotFound('Asset for this user does not exist.')
-
-        data: Dict[str, Union[float, str]] = {
-            'cost': asset.purchase_price,
-            'current_accumulated_depreciation': self.get_accumulated_depreciation(),
-            'sale_proceeds': float(self.sale_proceeds)
+            'sale_proceeds': sale_proceeds
         }
 
         # Determine if there is a need for new depreciation calculation
-        if self.get_depreciation_date() > self.get_last_depreciation_date():
-            accumulated_depreciation, book_value = self.get_accumulated_depreciations_till_date(asset)
+        if depreciation_date > last_depreciation_date:
+            book_value: Union[float, int] = self.get_depreciation_till_date(asset)
             data['depreciation_to_be_posted'] = accumulated_depreciation
             data['depreciation_to_be_posted_date'] = self.depreciation_to_be_posted_date
         else:
-            accumulated_depreciation = self.get_accumulated_depreciation()
             book_value = 0  # Reset book value for the case where no new depreciation is needed
+            # Depreciation already posted after the depreciation date is reversed
+            reversal_of_depreciation: Union[float, None] = self.get_accumulated_depreciation(
+                from_date=depreciation_date + timedelta(days=1))
+            if reversal_of_depreciation:
+                reversal_from: date = depreciation_date.replace(day=1)
+                data['reversal_of_depreciation'] = reversal_of_depreciation
+                data['reversal_of_depreciation_date'] = f'{reversal_from} to {last_depreciation_date}'
 
         # Calculate gain/loss based on sale price
-        gain_on_disposal = float(self.sale_proceeds) + book_value - asset.purchase_price
+        gain_on_disposal: float = sale_proceeds + book_value - asset.purchase_price
 
         if gain_on_disposal > 0:
             data['gain_on_disposal'] = round(gain_on_disposal, 2)
@@ -651,27 +553,45 @@ class DisposeAsset2:
             data['loss_on_disposal'] = abs(gain_on_disposal)
 
         # Add capital gain if applicable
-        if gain_on_disposal > 0 and asset.purchase_price < float(self.sale_proceeds):
-            data['capital_gain'] = float(self.sale_proceeds) - asset.purchase_price
-
-        # Check for reversal of depreciation
-        if (
-                self.reversal_of_depreciation_date_start
-                and self.reversal_of_depreciation_date_end
-                and self.reversal_of_depreciation_date_start < self.reversal_of_depreciation_date_end <
-                self.get_last_depreciation_date()
-        ):
-            reversal_from = self.reversal_of_depreciation_date_start.strftime('%Y-%m-%d')
-            reversal_to = self.reversal_of_depreciation_date_end.strftime('%Y-%m-%d')
-            data['reversal_of_depreciation'] = accumulated_depreciation
-            data['reversal_of_depreciation_date'] = f'{reversal_from} to {reversal_to}'
-
-            # Include reversal_of_depreciation and reversal_of_depreciation_date in data
-            data['depreciation_to_be_posted'] = accumulated_depreciation
-            data['depreciation_to_be_posted_date'] = self.depreciation_to_be_posted_date.strftime('%Y-%m-%d')
+        if gain_on_disposal > 0 and asset.purchase_price < sale_proceeds:
+            data['capital_gain'] = sale_proceeds - asset.purchase_price
+        return data
 
+    def calculate_journal_without_depreciation(self) -> dict:
+        # ND = No depreciation, everything depreciated since the purchase date is reversed
+        asset: Asset = self.load_depreciated()
+        depreciated_to: date = self.get_last_depreciation_date()
+        sale_proceeds: float = float(self.sale_proceeds)
+        data: Dict[str, Union[float, str]] = {
+            'cost': asset.purchase_price,
+            'current_accumulated_depreciation': self.get_accumulated_depreciation(),
+            'reversal_of_depreciation_date': f'{asset.purchase_date} to {depreciated_to}',
+            'reversal_of_depreciation_value': self.get_accumulated_depreciation(from_date=asset.purchase_date,
+                                                                                to_date=depreciated_to),
+            'sale_proceeds': sale_proceeds
+        }
+        if asset.purchase_price < sale_proceeds:
+            data['capital_gain'] = sale_proceeds - asset.purchase_price
+        elif asset.purchase_price > sale_proceeds:
+            data['loss_on_disposal'] = asset.purchase_price - sale_proceeds
         return data
 
+    def calculate(self, depreciation_this_year: Union[str, None]) -> dict:
+        if depreciation_this_year == 'AD':
+            return self.calculate_journal()
+        return self.calculate_journal_without_depreciation()
+
+    def get_gain_losses(self, depreciation_this_year: Union[str, None]) -> Union[float, None]:
+        # Gain (positive) or loss (negative) of the journal, None when the asset was never depreciated
+        self.load()
+        if not self.schedule:
+            return None
+        return self.get_journal_gain_losses(self.calculate(depreciation_this_year))
+
+    @staticmethod
+    def get_journal_gain_losses(data: dict) -> float:
+        return data.get('gain_on_disposal', 0) - data.get('loss_on_disposal', 0)
+
 
 if __name__ == '__main__':
     args_one = {
@@ -1,10 +1,10 @@
-from calendar import monthrange
-from datetime import datetime, date, timedelta
-from typing import Union, Dict
-from collections import OrderedDict
-from cffi.backend_ctypes import xrange
+from datetime import datetime, date
+from typing import Any, Union, Dict, List, Tuple
 
-from django.db.models import QuerySet, Sum
+from django.db import transaction
+from django.db.models import QuerySet, Sum, F, OuterRef, Subquery, Exists
+from django.db.models.functions import Round
+from django.utils import timezone
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework import permissions, status
 from rest_framework.exceptions import ValidationError, NotFound
@@ -14,10 +14,17 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .serializers import (AssetSettingSerializer, AssetTypeSerializer, AssetsSerializer, AssetsListSerializer,
-                          AssetTypeListSerializer, CalculatedDepreciationSerializer,
-                          AssetsGetSerializer, DisposedAssetsSerializer, AssetsDisposedListSerializer)
-from .models import AssetSetting, AssetType, Asset, CalculatedDepreciation, DisposedAsset
-from .utils import StraightLine, FullDepreciation, DecliningBalanceBy100Or150Or200, DisposeAsset2
+                          AssetTypeListSerializer, AssetsGetSerializer, DisposedAssetsSerializer,
+                          AssetsDisposedListSerializer, DepreciationRunSerializer)
+from .models import (AssetSetting, AssetType, Asset, CalculatedDepreciation, DisposedAsset, AssetAccount,
+                     DepreciationRun)
+from .utils import DisposeAsset2, annotate_book_values_as_of, annotate_ytd_depreciation, get_book_value
+from .periods import parse_date
+from .engine import DEPRECIATION_INPUTS
+from .runs import (ASSET_TYPE_INPUTS, DepreciationRunner, RunDiff, apply_asset_type, post_catch_up_schedules,
+                   post_schedule_changes, queue_run, recompute_assets)
+from .writers import refresh_depreciation_summary
+from xero_assets.settings import DEPRECIATION_BULK_CHUNK_SIZE
 
 
 class AssetSettingsView(APIView):
@@ -71,6 +78,10 @@ class AssetSettingsView(APIView):
             serializer: AssetSettingSerializer = AssetSettingSerializer(asset_setting, data=data, partial=True)
             if serializer.is_valid():
                 serializer.save()
+                if start_date:
+                    # Schedules start elsewhere, fully depreciated assets are computed again by the next run
+                    Asset.objects.filter(user=user).exclude(fully_depreciated_at=None).update(
+                        fully_depreciated_at=None)
                 return Response(data=serializer.data, status=status.HTTP_200_OK)
             raise ValidationError(serializer.errors)
         except AssetSetting.DoesNotExist:
@@ -151,10 +162,25 @@ class AssetTypesView(APIView, PageNumberPagination):
                 "rate": rate,
                 "effective_life": effective_life,
             }
+            # Apply to assets : copy the changed settings to the assets of the type and recompute them
+            apply_to_assets: bool = request.data.get('apply_to_assets') in (True, 'true', 'True', '1', 1)
             serializer: AssetTypeSerializer = AssetTypeSerializer(asset_type_obj, data=data, partial=True)
             if serializer.is_valid():
-                serializer.save()
-                return Response(data=serializer.data, status=status.HTTP_200_OK)
+                previous: Dict[str, Any] = {field: getattr(asset_type_obj, field) for field in ASSET_TYPE_INPUTS}
+                registered: List[int] = []
+                with transaction.atomic():
+                    asset_type_obj = serializer.save()
+                    data = serializer.data
+                    if apply_to_assets:
+                        data['applied_to_assets'], registered = apply_asset_type(asset_type_obj, previous)
+                # Recomputed once the type and its assets are committed, without holding their row locks.
+                # On failure the changed assets have no fingerprint, the next run recomputes them.
+                if registered:
+                    try:
+                        data['applied_to_assets'].update(recompute_assets(user, registered))
+                    except Exception as e:
+                        data['applied_to_assets']['error'] = '{}: {}'.format(type(e).__name__, e)
+                return Response(data=data, status=status.HTTP_200_OK)
             raise ValidationError(serializer.errors)
         except AssetType.DoesNotExist:
             raise NotFound('Asset type for this user do not exist.')
@@ -266,38 +292,13 @@ class AssetsView(APIView):
         }
         serializer: AssetsSerializer = AssetsSerializer(data=data)
         if serializer.is_valid():
-            depreciation_method = data['depreciation_method']
-            book_value = 0
-
-            if depreciation_method in ['ST', '100', '150', '200', 'FD']:
-                if depreciation_method == 'ST':
-                    book_value = StraightLine(data).calculate_depreciation()
-                elif depreciation_method in ['100', '150', '200']:
-                    book_value = DecliningBalanceBy100Or150Or200(data).calculate_depreciation()
-                elif depreciation_method == 'FD':
-                    book_value = FullDepreciation(data).calculate_depreciation()
-
             if data['asset_status'] == 'RE':
-                new_book_value = data['purchase_price'] - book_value
-                depreciation_start_date = datetime.strptime(data['depreciation_start_date'], '%Y-%m-%d').date()
-                last_month_day = monthrange(depreciation_start_date.year, depreciation_start_date.month)[1]
-                last_date = date(depreciation_start_date.year, depreciation_start_date.month, last_month_day)
-                data['book_value'] = new_book_value
-
-                asset = serializer.save()
-                asset.book_value = new_book_value
-                asset.save()
-
-                calculated_depreciation_serializer = CalculatedDepreciationSerializer(data={
-                    'asset': asset.pk,
-                    'depreciation_of': book_value,
-                    'depreciation_date': last_date
-                })
-
-                if calculated_depreciation_serializer.is_valid():
-                    calculated_depreciation_serializer.save()
-                    return Response(data=data, status=status.HTTP_200_OK)
-                raise ValidationError(calculated_depreciation_serializer.errors)
+                with transaction.atomic():
+                    asset = serializer.save()
+                    # Catch up to the last run of the user, one bulk insert
+                    post_catch_up_schedules(request.user, [asset])
+                data['book_value'] = asset.book_value
+                return Response(data=data, status=status.HTTP_200_OK)
 
         raise ValidationError(serializer.errors)
 
@@ -346,47 +347,20 @@ class AssetsView(APIView):
             }
             serializer: AssetsSerializer = AssetsSerializer(asset_obj, data=data, partial=True)
             if serializer.is_valid():
-                if depreciation_method == 'ST':
-                    book_value: Union[float, int] = StraightLine(data).calculate_depreciation()
-                elif depreciation_method in ['100', '150', '200']:
-                    book_value: Union[float, int] = (DecliningBalanceBy100Or150Or200(data)
-                                                     .calculate_depreciation())
-                elif depreciation_method == 'FD':
-                    book_value: Union[float, int] = FullDepreciation(data).calculate_depreciation()
-                else:
-                    book_value: Union[float, int] = 0
-                # Only if asset is registered
-                asset = serializer.save()
-                if asset_status == 'RE':
-                    new_book_value: float = int(data.get('purchase_price')) - book_value
-                    date_object: date = datetime.strptime(data.get('depreciation_start_date'),
-                                                          '%Y-%m-%d').date()
-                    last_month_day: int = monthrange(date_object.year, date_object.month)[1]
-                    last_date: date = date(date_object.year, date_object.month, last_month_day)
-                    data: Dict[str, Union[int, str, float, None]] = {
-                        **data,
-                        'book_value': new_book_value,
-                    }
-                    # Delete old calculations
-                    CalculatedDepreciation.objects.filter(asset=asset).delete()
-                    calculated_depreciation_serializer: CalculatedDepreciationSerializer = (
-                        CalculatedDepreciationSerializer(data={
-                            'asset': asset.pk,
-                            'depreciation_of': book_value,
-                            'depreciation_date': last_date
-                        }))
-                    asset = Asset.objects.get(pk=asset.pk)
-                    asset.book_value = new_book_value
-                    asset.save()
-                    if calculated_depreciation_serializer.is_valid():
-                        # insert new calculations
-                        calculated_depreciation_serializer.save()
-                        # Edit on register
-                        return Response(data=data, status=status.HTTP_200_OK)
-                    raise ValidationError(calculated_depreciation_serializer.errors)
-                else:
-                    # Edit on draft
-                    return Response(data=data, status=status.HTTP_200_OK)
+                # Only depreciation inputs change the schedule of a registered asset
+                recompute: bool = asset_status == 'RE' and (asset_obj.asset_status != 'RE' or any(
+                    field in serializer.validated_data and serializer.validated_data[field] != getattr(asset_obj, field)
+                    for field in DEPRECIATION_INPUTS + ('depreciation_start_date',)))
+                with transaction.atomic():
+                    asset = serializer.save()
+                    recomputed_from: Union[date, None] = post_schedule_changes(user, asset) if recompute else None
+                data = {
+                    **data,
+                    'book_value': asset.book_value,
+                    'recomputed': recomputed_from is not None,
+                    'recomputed_from': recomputed_from,
+                }
+                return Response(data=data, status=status.HTTP_200_OK)
             raise ValidationError(serializer.errors)
         except Asset.DoesNotExist:
             raise NotFound('Asset for this user do not exist.')
@@ -396,7 +370,8 @@ class AssetsView(APIView):
         user = request.user
         asset_pk: Union[int, str] = request.data.get('asset_pk')
         asset_pks_list = str(asset_pk).split(',')
-        Asset.objects.filter(user=user, pk__in=asset_pks_list).delete()
+        # Hidden right away, purged by purge_deleted_assets. The asset number can be reused.
+        Asset.objects.filter(user=user, pk__in=asset_pks_list).update(deleted_at=timezone.now(), asset_number=None)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @staticmethod
@@ -404,7 +379,7 @@ class AssetsView(APIView):
         user = request.user
         asset_pk: Union[int, str] = request.data.get('asset_pk')
         try:
-            asset = Asset.objects.get(pk=asset_pk, user=user)
+            asset = annotate_ytd_depreciation(Asset.objects.select_related('asset_type')).get(pk=asset_pk, user=user)
             if asset.asset_status == 'RE':
                 serializer: AssetsGetSerializer = AssetsGetSerializer(asset)
                 return Response(data=serializer.data, status=status.HTTP_200_OK)
@@ -414,83 +389,84 @@ class AssetsView(APIView):
             raise NotFound('Asset for this user do not exist.')
 
 
-class AssetsRegisterView(APIView):
+class AssetsSelectionView(APIView):
+    # Status change of the assets selected by a comma separated asset_pk, failures are reported asset by asset
     permission_classes = (permissions.IsAuthenticated,)
 
     @staticmethod
-    def post(request, *args, **kwargs):
-        user = request.user
-        asset_pk: Union[int, str] = request.data.get('asset_pk')
-        asset_pks_list = str(asset_pk).split(',')
-        assets = Asset.objects.filter(user=user, pk__in=asset_pks_list)
-        for asset in assets:
-            depreciation_start_date: str = '{}-{}-{}'.format(asset.depreciation_start_date.year,
-                                                             asset.depreciation_start_date.month,
-                                                             asset.depreciation_start_date.day)
-            data = {
-                'asset_name': asset.asset_name,
-                'asset_number': asset.asset_number,
-                'purchase_date': asset.purchase_date,
-                'purchase_price': float(asset.purchase_price) if asset.purchase_price else None,
-                'warranty_expiry': asset.warranty_expiry,
-                'serial_number': asset.serial_number,
-                'asset_type': asset.asset_type,
-                'region': asset.region,
-                'description': asset.description,
-                'depreciation_start_date': depreciation_start_date,
-                'cost_limit': float(asset.cost_limit) if asset.cost_limit else None,
-                'residual_value': float(asset.residual_value) if asset.residual_value else None,
-                'depreciation_method': asset.depreciation_method,
-                'averaging_method': asset.averaging_method,
-                'rate': float(asset.rate) if asset.rate else None,
-                'effective_life': float(asset.effective_life) if asset.effective_life else None,
-            }
-            if asset.depreciation_method == 'ST':
-                book_value: Union[float, int] = StraightLine(data).calculate_depreciation()
-            elif asset.depreciation_method in ['100', '150', '200']:
-                book_value: Union[float, int] = (DecliningBalanceBy100Or150Or200(data)
-                                                 .calculate_depreciation())
-            elif asset.depreciation_method == 'FD':
-                book_value: Union[float, int] = FullDepreciation(data).calculate_depreciation()
+    def get_asset_errors(asset: Asset) -> Dict[str, List[str]]:
+        return {}
+
+    def select_assets(self, user, asset_pk: Union[int, str]) -> Tuple[List[Asset], List[dict]]:
+        asset_pks: List[str] = [pk.strip() for pk in str(asset_pk).split(',') if pk.strip()]
+        assets: Dict[int, Asset] = {asset.pk: asset for asset in (
+            Asset.objects.filter(user=user, pk__in=[int(pk) for pk in asset_pks if pk.isdigit()])
+            .annotate(is_disposed=Exists(DisposedAsset.objects.filter(asset=OuterRef('pk')))))}
+        selected: Dict[int, Asset] = {}
+        results: List[dict] = []
+        for pk in asset_pks:
+            asset: Union[Asset, None] = assets.get(int(pk)) if pk.isdigit() else None
+            result: Dict[str, Union[int, str, dict]] = {'asset_pk': int(pk) if pk.isdigit() else pk}
+            if asset is None:
+                errors: Dict[str, List[str]] = {'asset_pk': ['Asset for this user do not exist.']}
+            elif asset.is_disposed or asset.asset_status == 'DI':
+                errors = {'asset_pk': ['Asset is disposed.']}
             else:
-                book_value: Union[float, int] = 0
-            new_book_value: float = int(data.get('purchase_price')) - book_value
-            date_object: date = datetime.strptime(data.get('depreciation_start_date'), '%Y-%m-%d').date()
-            last_month_day: int = monthrange(date_object.year, date_object.month)[1]
-            last_date: date = date(date_object.year, date_object.month, last_month_day)
-            # Delete old calculations
-            CalculatedDepreciation.objects.filter(asset=asset).delete()
-            calculated_depreciation_serializer: CalculatedDepreciationSerializer = (
-                CalculatedDepreciationSerializer(data={
-                    'asset': asset.pk,
-                    'depreciation_of': book_value,
-                    'depreciation_date': last_date
-                }))
-            asset.book_value = new_book_value
-            asset.asset_status = 'RE'
-            asset.save()
-            if calculated_depreciation_serializer.is_valid():
-                calculated_depreciation_serializer.save()
+                errors = self.get_asset_errors(asset)
+            if errors:
+                result['errors'] = errors
             else:
-                continue
-        return Response(status=status.HTTP_204_NO_CONTENT)
+                selected[asset.pk] = asset
+            results.append(result)
+        return list(selected.values()), results
 
 
-class AssetsDraftView(APIView):
-    permission_classes = (permissions.IsAuthenticated,)
+class AssetsRegisterView(AssetsSelectionView):
 
     @staticmethod
-    def post(request, *args, **kwargs):
+    def get_asset_errors(asset: Asset) -> Dict[str, List[str]]:
+        errors: Dict[str, List[str]] = {}
+        if asset.purchase_price is None:
+            errors['purchase_price'] = ['This field is required to register an asset.']
+        if asset.depreciation_start_date is None:
+            errors['depreciation_start_date'] = ['This field is required to register an asset.']
+        return errors
+
+    def post(self, request, *args, **kwargs):
         user = request.user
-        asset_pk: Union[int, str] = request.data.get('asset_pk')
-        asset_pks_list = str(asset_pk).split(',')
-        assets = Asset.objects.filter(user=user, pk__in=asset_pks_list)
-        for asset in assets:
-            asset.book_value = 0
-            asset.asset_status = 'DR'
-            CalculatedDepreciation.objects.filter(asset=asset).delete()
-            asset.save()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        assets, results = self.select_assets(user, request.data.get('asset_pk'))
+        if assets:
+            with transaction.atomic():
+                for asset in assets:
+                    asset.asset_status = 'RE'
+                    asset.depreciation_fingerprint = None
+                # Schedules from each start date to the last run of the user : one DELETE, one bulk insert
+                # and one bulk_update of the assets
+                post_catch_up_schedules(user, assets, update_fields=('asset_status', 'book_value',
+                                                                     'depreciation_fingerprint'))
+        data: Dict[str, Union[int, list]] = {
+            'registered': len(assets),
+            'items': results,
+        }
+        return Response(data=data, status=status.HTTP_200_OK)
+
+
+class AssetsDraftView(AssetsSelectionView):
+
+    def post(self, request, *args, **kwargs):
+        user = request.user
+        assets, results = self.select_assets(user, request.data.get('asset_pk'))
+        if assets:
+            drafted: QuerySet = Asset.objects.filter(pk__in=[asset.pk for asset in assets])
+            with transaction.atomic():
+                CalculatedDepreciation.objects.filter(asset__in=drafted).delete()
+                drafted.update(asset_status='DR', book_value=0, depreciation_fingerprint=None)
+                refresh_depreciation_summary(drafted)
+        data: Dict[str, Union[int, list]] = {
+            'drafted': len(assets),
+            'items': results,
+        }
+        return Response(data=data, status=status.HTTP_200_OK)
 
 
 class ListAssetsView(ListAPIView, PageNumberPagination):
@@ -508,7 +484,7 @@ class ListAssetsView(ListAPIView, PageNumberPagination):
 
     def get_queryset(self) -> Union[QuerySet, Asset]:
         user = self.request.user
-        queryset: QuerySet[Asset] = Asset.objects.filter(user=user)
+        queryset: QuerySet[Asset] = annotate_ytd_depreciation(Asset.objects.filter(user=user))
         return self.get_list_by_asset_status(queryset)
 
     def get_list_by_asset_status(self, queryset: QuerySet) -> QuerySet:
@@ -549,75 +525,40 @@ class AssetRunDepreciationView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
 
     @staticmethod
-    def get_list_of_dates(from_date: str, to_date: str) -> list:
-        dates = [from_date, to_date]
-        start, end = [datetime.strptime(_, "%Y-%m-%d") for _ in dates]
-        result = OrderedDict(((start + timedelta(_)).strftime(r"%m-%Y"), None)
-                             for _ in xrange((end - start).days)).keys()
-        last_dates = []
-        for i in list(result):
-            date_object: date = datetime.strptime(i, '%m-%Y').date()
-            last_month_day: int = monthrange(date_object.year, date_object.month)[1]
-            last_date: date = date(date_object.year, date_object.month, last_month_day)
-            last_dates.append(last_date)
-        return last_dates
-
-    def post(self, request, *args, **kwargs):
+    def post(request, *args, **kwargs):
         user = request.user
-        start_date = str(AssetSetting.objects.get(user=user).start_date)
         to_date: str = request.data.get('to_date')
-        list_of_dates: list = self.get_list_of_dates(start_date, to_date)
-        assets = Asset.objects.filter(user=user, asset_status='RE')
-        for asset in assets:
-            # Delete old calculations
-            CalculatedDepreciation.objects.filter(asset=asset).delete()
-            date_: date
-            for date_ in list_of_dates:
-                depreciation_start_date: str = '{}-{}-1'.format(date_.year, date_.month)
-                data = {
-                    'asset_name': asset.asset_name,
-                    'asset_number': asset.asset_number,
-                    'purchase_date': asset.purchase_date,
-                    'purchase_price': float(asset.purchase_price) if asset.purchase_price else None,
-                    'warranty_expiry': asset.warranty_expiry,
-                    'serial_number': asset.serial_number,
-                    'asset_type': asset.asset_type,
-                    'region': asset.region,
-                    'description': asset.description,
-                    'depreciation_start_date': depreciation_start_date,
-                    'cost_limit': float(asset.cost_limit) if asset.cost_limit else None,
-                    'residual_value': float(asset.residual_value) if asset.residual_value else None,
-                    'depreciation_method': asset.depreciation_method,
-                    'averaging_method': asset.averaging_method,
-                    'rate': float(asset.rate) if asset.rate else None,
-                    'effective_life': float(asset.effective_life) if asset.effective_life else None,
-                }
-                if asset.depreciation_method == 'ST':
-                    book_value: Union[float, int] = StraightLine(data).calculate_depreciation()
-                elif asset.depreciation_method in ['100', '150', '200']:
-                    book_value: Union[float, int] = (DecliningBalanceBy100Or150Or200(data)
-                                                     .calculate_depreciation())
-                elif asset.depreciation_method == 'FD':
-                    book_value: Union[float, int] = FullDepreciation(data).calculate_depreciation()
-                else:
-                    book_value: Union[float, int] = 0
-
-                calculated_depreciation_serializer: CalculatedDepreciationSerializer = (
-                    CalculatedDepreciationSerializer(data={
-                        'asset': asset.pk,
-                        'depreciation_of': book_value,
-                        'depreciation_date': date_
-                    }))
-                if calculated_depreciation_serializer.is_valid():
-                    calculated_depreciation_serializer.save()
-                    # Get the new book value
-                    asset.book_value = (int(data.get('purchase_price')) -
-                                        (CalculatedDepreciation.objects.filter(asset=asset)
-                                         .aggregate(Sum('depreciation_of'))).get('depreciation_of__sum'))
-                    asset.save()
-                else:
-                    continue
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        # Incremental : only compute the months after the last posted period
+        incremental: bool = request.data.get('incremental') in (True, 'true', 'True', '1', 1)
+        # Synchronous : run in the request instead of queuing a run for the depreciation_worker
+        synchronous: bool = request.data.get('synchronous') in (True, 'true', 'True', '1', 1)
+        # Dry run : what the run would change, nothing is written
+        dry_run: bool = request.data.get('dry_run') in (True, 'true', 'True', '1', 1)
+        try:
+            to_date: date = parse_date(to_date)
+        except (TypeError, ValueError):
+            raise ValidationError({'to_date': ['Date has wrong format. Use one of these formats instead: YYYY-MM-DD.']})
+        if not AssetSetting.objects.filter(user=user).exists():
+            raise NotFound('Asset setting for this user do not exist.')
+        if dry_run:
+            diff: RunDiff = DepreciationRunner(user, to_date, incremental=incremental).dry_run()
+            return Response(data=diff.to_dict(), status=status.HTTP_200_OK)
+        if synchronous:
+            DepreciationRunner(user, to_date, incremental=incremental).run()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        # A retry while the same run is pending returns that run
+        run: DepreciationRun = queue_run(user, to_date, incremental=incremental)
+        return Response(data=DepreciationRunSerializer(run).data, status=status.HTTP_202_ACCEPTED)
+
+    @staticmethod
+    def get(request, *args, **kwargs):
+        user = request.user
+        run_pk: int = kwargs.get('run_pk')
+        try:
+            run: DepreciationRun = DepreciationRun.objects.get(pk=run_pk, user=user)
+        except DepreciationRun.DoesNotExist:
+            raise NotFound('Depreciation run for this user do not exist.')
+        return Response(data=DepreciationRunSerializer(run).data, status=status.HTTP_200_OK)
 
 
 class AssetsRollBackDepreciationView(APIView):
@@ -628,18 +569,58 @@ class AssetsRollBackDepreciationView(APIView):
         user = request.user
         roll_back_to: str = request.data.get('roll_back_to')
         roll_back_to_date: date = datetime.strptime(roll_back_to, '%Y-%m-%d').date()
-        calculated_depreciations: Union[QuerySet, CalculatedDepreciation] = (CalculatedDepreciation.objects
-                                                                             .filter(asset__user=user))
-        i: Union[QuerySet, CalculatedDepreciation]
-        for i in calculated_depreciations:
-            if roll_back_to_date < i.depreciation_date:
-                i.asset.book_value += i.depreciation_of
-                i.asset.book_value = round(i.asset.book_value, 2)
-                i.asset.save()
-                i.delete()
+        calculated_depreciations: Union[QuerySet, CalculatedDepreciation] = (
+            CalculatedDepreciation.objects.filter(asset__user=user, asset__deleted_at=None,
+                                                  depreciation_date__gt=roll_back_to_date))
+        # Depreciation posted after roll_back_to, per asset
+        rolled_back: QuerySet = (calculated_depreciations.filter(asset=OuterRef('pk')).order_by()
+                                 .values('asset').annotate(total=Sum('depreciation_of')).values('total'))
+        with transaction.atomic():
+            asset_pks: List[int] = list(Asset.objects.filter(user=user, pk__in=calculated_depreciations.values('asset'))
+                                        .values_list('pk', flat=True))
+            (Asset.objects.filter(pk__in=asset_pks)
+             .update(book_value=Round(F('book_value') + Subquery(rolled_back), 2)))
+            calculated_depreciations.delete()
+            refresh_depreciation_summary(Asset.objects.filter(pk__in=asset_pks))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class AssetBookValueView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+
+    @staticmethod
+    def get(request, *args, **kwargs):
+        user = request.user
+        as_of: str = request.query_params.get('as_of')
+        asset_pk: Union[int, str, None] = request.query_params.get('asset_pk')
+        try:
+            as_of_date: date = datetime.strptime(as_of, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            raise ValidationError({'as_of': ['Date has wrong format. Use YYYY-MM-DD.']})
+        if asset_pk:
+            assets: QuerySet = Asset.objects.filter(user=user, pk=asset_pk)
+        else:
+            # Portfolio : assets on the books
+            assets: QuerySet = Asset.objects.filter(user=user, asset_status__in=['RE', 'DI']).order_by('pk')
+        book_values: List[Dict[str, Union[int, str, float]]] = [{
+            'asset_pk': asset['pk'],
+            'asset_number': asset['asset_number'],
+            'accumulated_depreciation': asset['accumulated_depreciation_as_of'],
+            'book_value': get_book_value(asset['purchase_price'], asset['accumulated_depreciation_as_of']),
+        } for asset in annotate_book_values_as_of(assets, as_of_date).values(
+            'pk', 'asset_number', 'purchase_price', 'accumulated_depreciation_as_of')]
+        if asset_pk:
+            if not book_values:
+                raise NotFound('Asset for this user do not exist.')
+            return Response(data={'as_of': as_of, **book_values[0]}, status=status.HTTP_200_OK)
+        data: Dict[str, Union[str, float, list]] = {
+            'as_of': as_of,
+            'book_value': sum(book_value['book_value'] for book_value in book_values),
+            'assets': book_values,
+        }
+        return Response(data=data, status=status.HTTP_200_OK)
+
+
 class AssetsDisposeView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
 
@@ -705,62 +686,20 @@ class AssetsDisposeView(APIView):
     @staticmethod
     def get(request, *args, **kwargs):
         user = request.user
-        asset_pk = request.data.get('asset_pk')
-
-        try:
-            asset = Asset.objects.prefetch_related('calculated_depreciation_asset').get(user=user, pk=asset_pk)
-        except Asset.DoesNotExist:
-            return Response({'detail': 'Asset for this user does not exist.'}, status=status.HTTP_404_NOT_FOUND)
-
-        dispose_date = request.data.get('dispose_date')
-        sale_proceeds = request.data.get('sale_proceeds')
-        sale_proceeds_account_pk = request.data.get('sale_proceeds_account_pk')
         depreciation_this_year = request.data.get('depreciation_this_year')
-        # data: Dict[str, Union[float, str]] = {}
-
+        dispose_asset = DisposeAsset2({
+            'user': user,
+            'dispose_date': request.data.get('dispose_date'),
+            'sale_proceeds': request.data.get('sale_proceeds'),
+            'proceeds_account_pk': request.data.get('sale_proceeds_account_pk'),
+            'depreciation_date': request.data.get('depreciation_date'),
+            'asset_pk': request.data.get('asset_pk')
+        })
         try:
-            if depreciation_this_year == 'AD':
-                depreciation_date = request.data.get('depreciation_date')
-                dispose_asset = DisposeAsset2({
-                    'user': user,
-                    'dispose_date': dispose_date,
-                    'sale_proceeds': sale_proceeds,
-                    'proceeds_account_pk': sale_proceeds_account_pk,
-                    'depreciation_date': depreciation_date,
-                    'asset_pk': asset_pk
-                })
-                data = dispose_asset.calculate_journal()
-            else:
-                accumulated_depreciation = CalculatedDepreciation.objects.filter(asset=asset_pk) \
-                    .aggregate(Sum('depreciation_of')).get('depreciation_of__sum')
-
-                purchase_date = asset.purchase_date.strftime('%Y-%m-%d')
-                depreciated_to_obj = CalculatedDepreciation.objects.filter(asset=asset_pk).latest('depreciation_date') \
-                    .depreciation_date
-                depreciated_to = depreciated_to_obj.strftime('%Y-%m-%d')
-
-                reversal_of_depreciation = CalculatedDepreciation.objects.filter(asset=asset_pk) \
-                    .filter(depreciation_date__gte=asset.purchase_date, depreciation_date__lte=depreciated_to_obj) \
-                    .aggregate(Sum('depreciation_of')).get('depreciation_of__sum')
-
-                data = {
-                    'cost': asset.purchase_price,
-                    'current_accumulated_depreciation': accumulated_depreciation,
-                    'reversal_of_depreciation_date': f'{purchase_date} to {depreciated_to}',
-                    'reversal_of_depreciation_value': reversal_of_depreciation,
-                    'sale_proceeds': float(sale_proceeds)
-                }
-
-                if asset.purchase_price == float(sale_proceeds):
-                    return Response(data, status=status.HTTP_200_OK)
-                elif asset.purchase_price < float(sale_proceeds):
-                    data['capital_gain'] = float(sale_proceeds) - asset.purchase_price
-                else:
-                    data['loss_on_disposal'] = asset.purchase_price - float(sale_proceeds)
-
-        except ValueError as e:
+            # AD = All depreciation, ND = No depreciation
+            data = dispose_asset.calculate(depreciation_this_year)
+        except (TypeError, ValueError) as e:
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
         return Response(data, status=status.HTTP_200_OK)
 
     @staticmethod
@@ -775,23 +714,141 @@ class AssetsDisposeView(APIView):
         gain_losses: int = request.data.get('gain_losses', None)
         try:
             asset = Asset.objects.get(pk=asset_pk, user=user)
-            serializer: DisposedAssetsSerializer = DisposedAssetsSerializer(data={
-                'asset': asset.pk,
-                'disposal_date': dispose_date,
-                'disposal_price': dispose_price,
-                'capital_gain_on_disposal': gain_on_disposal_account,
-                'gain_on_disposal': capital_gain_account,
-                'loss_on_disposal': loss_on_disposal_account,
-                'gain_losses': gain_losses,
-            })
-            if serializer.is_valid():
-                serializer.save()
-                asset.asset_status = 'DI'
-                asset.save()
-                return Response(data=serializer.data, status=status.HTTP_200_OK)
-            raise ValidationError(serializer.errors)
         except Asset.DoesNotExist:
             raise NotFound('Asset for this user do not exist.')
+        if gain_losses is None and dispose_price is not None:
+            # Same journal as the preview (GET)
+            dispose_asset = DisposeAsset2({
+                'user': user,
+                'dispose_date': dispose_date,
+                'sale_proceeds': dispose_price,
+                'depreciation_date': request.data.get('depreciation_date', dispose_date),
+                'asset': asset,
+            })
+            try:
+                gain_losses = dispose_asset.get_gain_losses(request.data.get('depreciation_this_year'))
+            except (TypeError, ValueError) as e:
+                raise ValidationError({'detail': str(e)})
+        serializer: DisposedAssetsSerializer = DisposedAssetsSerializer(data={
+            'asset': asset.pk,
+            'disposal_date': dispose_date,
+            'disposal_price': dispose_price,
+            'gain_on_disposal_account': gain_on_disposal_account,
+            'capital_gain_account': capital_gain_account,
+            'loss_on_disposal_account': loss_on_disposal_account,
+            'gain_losses': gain_losses,
+        })
+        if serializer.is_valid():
+            serializer.save()
+            asset.asset_status = 'DI'
+            asset.save()
+            refresh_depreciation_summary(Asset.objects.filter(pk=asset.pk))
+            return Response(data=serializer.data, status=status.HTTP_200_OK)
+        raise ValidationError(serializer.errors)
+
+
+class AssetsDisposeBatchView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+    # Item key : (DisposedAsset field, AssetSetting default field)
+    disposal_accounts: Dict[str, tuple] = {
+        'gain_on_disposal_account_pk': ('gain_on_disposal_account_id', 'gain_on_disposal_id'),
+        'capital_gain_account_pk': ('capital_gain_account_id', 'capital_gain_on_disposal_id'),
+        'loss_on_disposal_account_pk': ('loss_on_disposal_account_id', 'loss_on_disposal_id'),
+    }
+
+    @staticmethod
+    def get_asset_pk(item: dict) -> Union[int, None]:
+        try:
+            return int(item.get('asset_pk'))
+        except (TypeError, ValueError):
+            return None
+
+    def post(self, request, *args, **kwargs):
+        user = request.user
+        items: list = request.data.get('items')
+        preview: bool = request.data.get('preview') in (True, 'true', 'True', '1', 1)
+        if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+            raise ValidationError({'items': ['Expected a non-empty list of disposals.']})
+        # Shared prefetching : assets, schedules, accounts and default accounts of the user (4 queries)
+        asset_pks: List[int] = [pk for pk in map(self.get_asset_pk, items) if pk is not None]
+        assets: Dict[int, Asset] = {asset.pk: asset for asset in (
+            Asset.objects.filter(user=user, pk__in=asset_pks)
+            .annotate(is_disposed=Exists(DisposedAsset.objects.filter(asset=OuterRef('pk')))))}
+        schedules: Dict[int, list] = DisposeAsset2.get_schedule(list(assets.values())) if assets else {}
+        account_pks: set = {item[key] for item in items for key in self.disposal_accounts if item.get(key)}
+        existing_accounts: set = set(AssetAccount.objects.filter(pk__in=[pk for pk in account_pks
+                                                                         if str(pk).isdigit()])
+                                     .values_list('pk', flat=True))
+        default_accounts: Dict[str, Union[int, None]] = (AssetSetting.objects.filter(user=user).values(
+            *(default for _, default in self.disposal_accounts.values())).first() or {})
+
+        results: List[dict] = []
+        disposed_assets: List[DisposedAsset] = []
+        seen: set = set()
+        for item in items:
+            asset_pk: Union[int, None] = self.get_asset_pk(item)
+            result: Dict[str, Union[int, dict, float, None]] = {'asset_pk': item.get('asset_pk')}
+            errors: Dict[str, list] = {}
+            asset: Union[Asset, None] = assets.get(asset_pk)
+            if asset is None:
+                errors['asset_pk'] = ['Asset for this user do not exist.']
+            elif asset.is_disposed or asset.asset_status == 'DI':
+                errors['asset_pk'] = ['Asset is already disposed.']
+            elif asset_pk in seen:
+                errors['asset_pk'] = ['Asset is disposed more than once in this batch.']
+            dispose_date: str = item.get('dispose_date')
+            try:
+                datetime.strptime(dispose_date, '%Y-%m-%d')
+            except (TypeError, ValueError):
+                errors['dispose_date'] = ['Date has wrong format. Use YYYY-MM-DD.']
+            accounts: Dict[str, Union[int, None]] = {}
+            for key, (field, default) in self.disposal_accounts.items():
+                account_pk = item.get(key) or default_accounts.get(default)
+                if item.get(key) and (not str(account_pk).isdigit() or int(account_pk) not in existing_accounts):
+                    errors[key] = ['Account does not exist.']
+                accounts[field] = account_pk
+            if not errors:
+                dispose_asset = DisposeAsset2({
+                    'user': user,
+                    'dispose_date': dispose_date,
+                    'sale_proceeds': item.get('sale_proceeds'),
+                    'depreciation_date': item.get('depreciation_date', dispose_date),
+                    'asset': asset,
+                    'schedule': schedules[asset_pk],
+                })
+                try:
+                    # AD = All depreciation, ND = No depreciation
+                    journal: dict = dispose_asset.calculate(item.get('depreciation_this_year',
+                                                                     request.data.get('depreciation_this_year')))
+                    result['journal'] = journal
+                    result['gain_losses'] = (float(item['gain_losses']) if item.get('gain_losses') is not None
+                                             else DisposeAsset2.get_journal_gain_losses(journal))
+                except ValidationError as e:
+                    errors.update(e.detail)
+                except (TypeError, ValueError) as e:
+                    errors['detail'] = [str(e)]
+            if errors:
+                result['errors'] = errors
+            else:
+                seen.add(asset_pk)
+                disposed_assets.append(DisposedAsset(asset=asset, disposal_date=dispose_date,
+                                                     disposal_price=float(item.get('sale_proceeds')),
+                                                     gain_losses=result['gain_losses'], **accounts))
+            results.append(result)
+
+        if not preview and disposed_assets:
+            with transaction.atomic():
+                DisposedAsset.objects.bulk_create(disposed_assets, batch_size=DEPRECIATION_BULK_CHUNK_SIZE)
+                disposed: QuerySet = Asset.objects.filter(pk__in=[disposed_asset.asset_id
+                                                                  for disposed_asset in disposed_assets])
+                disposed.update(asset_status='DI')
+                refresh_depreciation_summary(disposed)
+        data: Dict[str, Union[bool, int, list]] = {
+            'preview': preview,
+            'disposed': 0 if preview else len(disposed_assets),
+            'items': results,
+        }
+        return Response(data=data, status=status.HTTP_200_OK)
 
 
 class ListAssetsDisposedView(ListAPIView, PageNumberPagination):
@@ -814,7 +871,7 @@ class ListAssetsDisposedView(ListAPIView, PageNumberPagination):
 
     def get_queryset(self) -> Union[QuerySet, DisposedAsset]:
         user = self.request.user
-        return DisposedAsset.objects.filter(asset__user=user, asset__asset_status='DI')
+        return DisposedAsset.objects.filter(asset__user=user, asset__asset_status='DI', asset__deleted_at=None)
 
     def list(self, request, *args, **kwargs):
         queryset: Union[QuerySet, DisposedAsset] = self.get_queryset()
@@ -836,9 +893,11 @@ class AssetsUndisposeView(APIView):
             asset = Asset.objects.get(pk=asset_pk, user=user)
             asset.asset_status = 'RE'
             asset.book_value = asset.purchase_price
+            asset.depreciation_fingerprint = None
             asset.save()
             CalculatedDepreciation.objects.filter(asset=asset).delete()
             DisposedAsset.objects.filter(asset=asset).delete()
+            refresh_depreciation_summary(Asset.objects.filter(pk=asset.pk))
             return Response(status=status.HTTP_200_OK)
         except Asset.DoesNotExist:
             raise NotFound('Asset for this user do not exist.')
@@ -0,0 +1,124 @@
+from datetime import date
+from typing import Dict, Iterable, List, Sequence, Union
+
+from django.db import transaction
+from django.db.models import QuerySet, Sum, Max, Count, OuterRef, Subquery, Case, When
+from django.db.models.functions import Coalesce, Floor
+from django.db.models.lookups import GreaterThanOrEqual
+from rest_framework.exceptions import ValidationError
+
+from xero_assets.settings import DEPRECIATION_BULK_CHUNK_SIZE
+from .models import Asset, CalculatedDepreciation, DisposedAsset
+
+
+def refresh_depreciation_summary(assets: QuerySet) -> int:
+    # Accumulated total, last depreciated-to date, total at the start of the year and row count, in one UPDATE
+    year_start: date = date.today().replace(month=1, day=1)
+    calculated_depreciations: QuerySet = (CalculatedDepreciation.objects.filter(asset=OuterRef('pk'))
+                                          .order_by().values('asset'))
+    accumulated_depreciation = Coalesce(Subquery(calculated_depreciations.annotate(
+        total=Sum('depreciation_of')).values('total')), 0.0)
+    depreciated_to = Subquery(calculated_depreciations.annotate(last=Max('depreciation_date')).values('last'))
+    # Running total of the last row of the previous years
+    year_start_accumulated_depreciation = Subquery(
+        CalculatedDepreciation.objects.filter(asset=OuterRef('pk'), depreciation_date__lt=year_start)
+        .order_by('-depreciation_date').values('accumulated_depreciation')[:1])
+    # Book value at the residual value (see utils.get_depreciable_amount), to half a cent
+    depreciable_amount = Floor(Coalesce('purchase_price', 0.0)) - Coalesce('residual_value', 0.0)
+    return assets.update(
+        accumulated_depreciation=accumulated_depreciation,
+        depreciated_to=depreciated_to,
+        fully_depreciated_at=Case(When(GreaterThanOrEqual(accumulated_depreciation, depreciable_amount - 0.005),
+                                       then=depreciated_to), default=None),
+        year_start_accumulated_depreciation=Coalesce(year_start_accumulated_depreciation, 0.0),
+        ytd_year=year_start.year,
+        depreciation_rows=Coalesce(Subquery(calculated_depreciations.annotate(
+            count=Count('pk')).values('count')), 0),
+    )
+
+
+def delete_assets(assets: QuerySet, chunk_size: Union[int, None] = None) -> int:
+    # Schedules, disposals then the assets, chunk_size assets per transaction. The schedules and disposals are
+    # deleted with one DELETE each, only the assets of the chunk are loaded by QuerySet.delete().
+    chunk_size = chunk_size or DEPRECIATION_BULK_CHUNK_SIZE
+    asset_pks: List[int] = list(assets.order_by('pk').values_list('pk', flat=True))
+    deleted: int = 0
+    for start in range(0, len(asset_pks), chunk_size):
+        chunk: List[int] = asset_pks[start:start + chunk_size]
+        with transaction.atomic():
+            CalculatedDepreciation.objects.filter(asset__in=chunk).delete()
+            DisposedAsset.objects.filter(asset__in=chunk).delete()
+            _, deleted_per_model = Asset.all_objects.filter(pk__in=chunk).delete()
+            deleted += deleted_per_model.get(Asset._meta.label, 0)
+    return deleted
+
+
+class ScheduleWriter:
+    """Bulk write path for CalculatedDepreciation rows and Asset.book_value.
+
+    Rows are collected with add() then inserted by save() with bulk_create, chunk_size rows per
+    statement, in one transaction with the asset updates. Every touched asset gets its new book value
+    (purchase price - accumulated depreciation) in a single bulk_update, and a refreshed
+    depreciation summary.
+    """
+
+    def __init__(self, user, chunk_size: Union[int, None] = None):
+        self.user = user
+        self.chunk_size: int = chunk_size or DEPRECIATION_BULK_CHUNK_SIZE
+        self.assets: Dict[int, Asset] = {}
+        self.rows: List[CalculatedDepreciation] = []
+        self.deleted: List[int] = []
+
+    def delete(self, assets: Iterable[Asset]) -> int:
+        # Old calculations of the given assets, one statement
+        asset_pks: List[int] = [asset.pk for asset in assets]
+        self.deleted.extend(asset_pks)
+        deleted, _ = CalculatedDepreciation.objects.filter(asset__in=asset_pks, asset__user=self.user).delete()
+        return deleted
+
+    def add(self, asset: Asset, dates: Sequence[date], depreciations: Sequence[float]) -> None:
+        # Rows must come after the asset's existing rows, in date order
+        self.assets[asset.pk] = asset
+        self.rows.extend(CalculatedDepreciation(asset_id=asset.pk, depreciation_of=depreciation_of,
+                                                depreciation_date=date_)
+                         for date_, depreciation_of in zip(dates, depreciations))
+
+    def validate(self) -> None:
+        # One query instead of a serializer FK lookup per row
+        owned = set(Asset.objects.filter(user=self.user, pk__in=list(self.assets)).values_list('pk', flat=True))
+        missing: List[int] = [pk for pk in self.assets if pk not in owned]
+        if missing:
+            raise ValidationError({'asset': ['Asset for this user do not exist: {}'.format(missing)]})
+
+    def get_accumulated_depreciations(self) -> Dict[int, float]:
+        calculated_depreciations: QuerySet = (CalculatedDepreciation.objects.filter(asset__in=list(self.assets))
+                                              .order_by().values_list('asset').annotate(Sum('depreciation_of')))
+        return dict(calculated_depreciations)
+
+    def refresh_depreciation_summary(self) -> None:
+        asset_pks: List[int] = list(set(self.assets) | set(self.deleted))
+        for start in range(0, len(asset_pks), self.chunk_size):
+            refresh_depreciation_summary(Asset.objects.filter(pk__in=asset_pks[start:start + self.chunk_size]))
+
+    def save(self, update_fields: Sequence[str] = ('book_value',)) -> int:
+        # One transaction : rows, book values and summaries are written together or not at all
+        with transaction.atomic():
+            if not self.assets:
+                self.refresh_depreciation_summary()
+                self.deleted = []
+                return 0
+            self.validate()
+            # Continue the running totals from what is already posted
+            accumulated_depreciations: Dict[int, float] = self.get_accumulated_depreciations()
+            for row in self.rows:
+                accumulated_depreciation: float = accumulated_depreciations.get(row.asset_id, 0.0) + row.depreciation_of
+                row.accumulated_depreciation = accumulated_depreciations[row.asset_id] = accumulated_depreciation
+            CalculatedDepreciation.objects.bulk_create(self.rows, batch_size=self.chunk_size)
+            for asset in self.assets.values():
+                if asset.pk in accumulated_depreciations:
+                    asset.book_value = int(asset.purchase_price) - accumulated_depreciations[asset.pk]
+            Asset.objects.bulk_update(self.assets.values(), list(update_fields), batch_size=self.chunk_size)
+            self.refresh_depreciation_summary()
+        written: int = len(self.rows)
+        self.assets, self.rows, self.deleted = {}, [], []
+        return written
@@ -0,0 +1,65 @@
+import os
+import sys
+from calendar import isleap, monthrange
+from datetime import date, datetime, timedelta
+from timeit import timeit
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'xero_assets.settings')
+django.setup()
+
+from fixed_assets.periods import get_month_ends  # noqa: E402
+from fixed_assets.utils import AssetParams, StraightLine  # noqa: E402
+
+
+class StringStraightLine(StraightLine):
+    # Day counts as they were computed before AssetParams : the start date string is parsed on every call
+    def days_in_year(self) -> int:
+        year = str(self.kwargs['depreciation_start_date']).split('-')
+        return 365 + isleap(int(year[0]))
+
+    def number_of_days_in_month(self) -> int:
+        date_object = datetime.strptime(str(self.kwargs['depreciation_start_date']).split(' ')[0], '%Y-%m-%d').date()
+        last_date = date(date_object.year, date_object.month, monthrange(date_object.year, date_object.month)[1])
+        delta: timedelta = last_date - date_object
+        return max(delta.days, 1)
+
+
+asset = {
+    'purchase_price': 6000.0,
+    'cost_limit': 3000.0,
+    'residual_value': 600.0,
+    'averaging_method': 'AD',
+    'rate': 20.0,
+    'effective_life': 5.0,
+    'depreciation_method': 'ST',
+}
+# 30 years of monthly periods
+periods = get_month_ends('1995-01-01', '2025-01-01')
+
+
+def kwargs_per_month():
+    for period in periods:
+        data = {**asset, 'depreciation_start_date': '{}-{}-1'.format(period.year, period.month)}
+        StringStraightLine(data).calculate_depreciation()
+
+
+def params_per_month():
+    for period in periods:
+        params = AssetParams.create(period.replace(day=1), **asset)
+        StraightLine(params).calculate_depreciation()
+
+
+if __name__ == '__main__':
+    assert [StringStraightLine({**asset, 'depreciation_start_date': str(period.replace(day=1))})
+            .calculate_depreciation() for period in periods] == \
+           [StraightLine(AssetParams.create(period.replace(day=1), **asset)).calculate_depreciation()
+            for period in periods]
+    number = 200
+    kwargs_time = timeit(kwargs_per_month, number=number)
+    params_time = timeit(params_per_month, number=number)
+    print(f'{len(periods)} months x {number} runs')
+    print(f'kwargs dict, string dates : {kwargs_time:.3f}s')
+    print(f'AssetParams               : {params_time:.3f}s ({kwargs_time / params_time:.1f}x)')
@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, Set, Tuple
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'xero_assets.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from auth.models import CustomUser  # noqa: E402
+
+# Tables that grow with the portfolios, a sequential scan of them is a bug once they hold min_rows rows
+LARGE_TABLES = ('fixed_assets_asset', 'fixed_assets_calculateddepreciation', 'fixed_assets_disposedasset')
+
+# Hot endpoints : name, method, path, data, indexes their plans must use
+ENDPOINTS: List[Tuple[str, str, str, dict, Tuple[str, ...]]] = [
+    ('assets list', 'get', '/fixed-assets/assets-list/', {'asset_status': 'RE'}, ('asset_user_status_idx',)),
+    ('drafts list', 'get', '/fixed-assets/assets-list/', {'asset_status': 'DR'}, ('asset_user_status_idx',)),
+    ('disposed list', 'get', '/fixed-assets/asset-dispose-list/', {}, ('asset_user_status_idx',)),
+    ('book values', 'get', '/fixed-assets/book-value/', {'as_of': '2026-06-30'}, ('depreciation_asset_date_uniq',)),
+    ('run dry run', 'post', '/fixed-assets/asset-run-depreciation/',
+     {'to_date': '2027-01-01', 'incremental': True, 'dry_run': True}, ('depreciation_asset_date_uniq',)),
+]
+
+
+def seed(users: int, assets: int, months: int) -> CustomUser:
+    # users tenants of assets registered assets with months rows each, 1 in 10 drafts and 1 in 50 disposed
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO fixed_assets_assetaccount (account_type_code, tax)
+            VALUES ('A1', 'ES'), ('B1', 'ES'), ('C1', 'ES')
+        """)
+        for index in range(users):
+            user: CustomUser = CustomUser.objects.create_user('explain{}@example.com'.format(index), 'explain')
+            cursor.execute("""
+                INSERT INTO fixed_assets_assetsetting (user_id, start_date)
+                VALUES (%(user)s, DATE '2022-01-01');
+                INSERT INTO fixed_assets_assettype (user_id, asset_type, asset_account_id,
+                    accumulated_depreciation_account_id, depreciation_expense_account_id,
+                    depreciation_method, averaging_method, rate)
+                SELECT %(user)s, 'Explain', MIN(id), MIN(id), MIN(id), 'ST', 'FM', 20 FROM fixed_assets_assetaccount;
+                INSERT INTO fixed_assets_asset (user_id, asset_name, asset_number, purchase_date, purchase_price,
+                    asset_type_id, region, depreciation_start_date, depreciation_method, averaging_method, rate,
+                    asset_status, book_value, accumulated_depreciation, depreciated_to, depreciation_rows,
+                    year_start_accumulated_depreciation)
+                SELECT %(user)s, 'asset ' || n, %(user)s || '-' || n, DATE '2022-01-01', 6000,
+                    (SELECT MAX(id) FROM fixed_assets_assettype WHERE user_id = %(user)s), 'E', DATE '2022-01-01',
+                    'ST', 'FM', 20, CASE WHEN n %% 10 = 0 THEN 'DR' WHEN n %% 50 = 1 THEN 'DI' ELSE 'RE' END,
+                    6000, 0, NULL, 0, 0
+                FROM generate_series(1, %(assets)s) n;
+            """, {'user': user.pk, 'assets': assets})
+        cursor.execute("""
+            INSERT INTO fixed_assets_calculateddepreciation (asset_id, depreciation_date, depreciation_of,
+                accumulated_depreciation)
+            SELECT asset.id, (DATE '2022-01-01' + (n || ' month')::interval - INTERVAL '1 day')::date, 100, 100 * n
+            FROM fixed_assets_asset asset, generate_series(1, %(months)s) n
+            WHERE asset.asset_status <> 'DR';
+            INSERT INTO fixed_assets_disposedasset (asset_id, disposal_date, disposal_price, gain_losses)
+            SELECT id, DATE '2026-12-31', 100, 0 FROM fixed_assets_asset WHERE asset_status = 'DI';
+        """, {'months': months})
+        # Statistics, and the visibility map index only scans depend on
+        cursor.execute('VACUUM ANALYZE')
+    return CustomUser.objects.get(email='explain0@example.com')
+
+
+def walk(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from walk(child)
+
+
+def explain(sql: str) -> List[dict]:
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+        plan = cursor.fetchone()[0]
+    return list(walk((json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']))
+
+
+def get_large_tables(min_rows: int) -> List[str]:
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relname FROM pg_class WHERE relname IN %s AND reltuples >= %s',
+                       [LARGE_TABLES, min_rows])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def check_endpoint(client: APIClient, method: str, path: str, data: dict, indexes: Tuple[str, ...],
+                   large_tables: List[str]) -> Tuple[int, List[str]]:
+    # Number of explained queries, and the sequential scans of large tables or expected indexes not used
+    with CaptureQueriesContext(connection) as context:
+        response = getattr(client, method)(path, data, format='json') if method == 'post' else \
+            getattr(client, method)(path, data)
+    if response.status_code >= 400:
+        return 0, ['HTTP {}'.format(response.status_code)]
+    explained: int = 0
+    failures: List[str] = []
+    used: Set[str] = set()
+    for query in context.captured_queries:
+        sql: str = query['sql']
+        if not sql.lstrip().upper().startswith('SELECT') or not any(table in sql for table in LARGE_TABLES):
+            continue
+        explained += 1
+        for node in explain(sql):
+            if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in large_tables:
+                failures.append('Seq Scan on {} : {}'.format(node['Relation Name'], sql[:200]))
+            if node.get('Index Name'):
+                used.add(node['Index Name'])
+    failures.extend('{} not used'.format(index) for index in indexes if index not in used)
+    return explained, failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Seed a test database and check with EXPLAIN that the queries '
+                                                 'of the hot endpoints use index scans on the large tables.')
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--assets', type=int, default=5000, help='Assets per user')
+    parser.add_argument('--months', type=int, default=60, help='Schedule rows per asset')
+    parser.add_argument('--min-rows', type=int, default=10000,
+                        help='Smaller tables can be scanned, a sequential scan is then the cheapest plan')
+    parser.add_argument('--keepdb', action='store_true', help='Keep the seeded test database for the next run')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name: str = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=args.keepdb)
+    failed: bool = False
+    try:
+        user: CustomUser = (CustomUser.objects.filter(email='explain0@example.com').first() or
+                            seed(args.users, args.assets, args.months))
+        client: APIClient = APIClient(HTTP_HOST='127.0.0.1')
+        client.force_authenticate(user)
+        large_tables: List[str] = get_large_tables(args.min_rows)
+        results: Dict[str, Tuple[int, List[str]]] = {}
+        for name, method, path, data, indexes in ENDPOINTS:
+            results[name] = check_endpoint(client, method, path, data, indexes, large_tables)
+        for name, (explained, failures) in results.items():
+            print('{:<16} {:>3} queries {}'.format(name, explained, 'FAILED' if failures else 'ok'))
+            for failure in failures:
+                print('    ' + failure)
+            failed = failed or bool(failures)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,7 +9,7 @@ https://docs.djangoproject.com/en/4.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
-from os import path
+from os import path, cpu_count
 from datetime import timedelta
 from pathlib import Path
 from decouple import config
@@ -230,3 +230,25 @@ LOGGING = {
 # Xero configs
 XERO_CLIENT_ID = config('XERO_CLIENT_ID')
 XERO_CLIENT_SECRET = config('XERO_CLIENT_SECRET')
+
+# Depreciation runs
+# Rows per bulk insert / bulk update statement (one transaction per chunk)
+DEPRECIATION_BULK_CHUNK_SIZE = config('DEPRECIATION_BULK_CHUNK_SIZE', default=5000, cast=int)
+# Worker processes computing the schedules (1 = in-process), assets per worker task
+DEPRECIATION_RUN_WORKERS = config('DEPRECIATION_RUN_WORKERS', default=cpu_count() or 1, cast=int)
+DEPRECIATION_RUN_CHUNK_SIZE = config('DEPRECIATION_RUN_CHUNK_SIZE', default=2000, cast=int)
+# Smaller portfolios are computed in-process, starting the workers would cost more than it saves
+DEPRECIATION_RUN_PARALLEL_THRESHOLD = config('DEPRECIATION_RUN_PARALLEL_THRESHOLD', default=20000, cast=int)
+# Assets per work unit : computed and committed in one transaction by one worker
+DEPRECIATION_RUN_BATCH_SIZE = config('DEPRECIATION_RUN_BATCH_SIZE', default=5000, cast=int)
+# Work units computed at the same time by one depreciation_worker, seconds between two polls of the queue
+DEPRECIATION_WORKER_CONCURRENCY = config('DEPRECIATION_WORKER_CONCURRENCY', default=2, cast=int)
+DEPRECIATION_WORKER_POLL_INTERVAL = config('DEPRECIATION_WORKER_POLL_INTERVAL', default=5.0, cast=float)
+# Seconds a claimed work unit stays leased without heartbeat, claims before a unit is failed
+DEPRECIATION_WORK_UNIT_LEASE = config('DEPRECIATION_WORK_UNIT_LEASE', default=300, cast=int)
+DEPRECIATION_WORK_UNIT_MAX_ATTEMPTS = config('DEPRECIATION_WORK_UNIT_MAX_ATTEMPTS', default=3, cast=int)
+# Asset type changes applied to more registered assets than this are recomputed by a queued run
+DEPRECIATION_APPLY_SYNC_LIMIT = config('DEPRECIATION_APPLY_SYNC_LIMIT', default=1000, cast=int)
+# Deleted assets purged per transaction by purge_deleted_assets, seconds between two batches
+ASSET_PURGE_BATCH_SIZE = config('ASSET_PURGE_BATCH_SIZE', default=200, cast=int)
+ASSET_PURGE_INTERVAL = config('ASSET_PURGE_INTERVAL', default=1.0, cast=float)